@@ -10,9 +10,21 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from data_processor import DataProcessor
+from data_processor import (
+    DataProcessor, InstantaneaLimpieza, RANGO_SLA_ALMACEN, RANGO_SLA_PRINCIPAL, RANGO_SLA_OTRAS,
+)
+from readers import cargar_libro
+from filtros import IndiceFiltros, COLUMNA_VALOR
+from cache_memoria import CacheLRU, ProcesadorMemoizado, TAMANO_MAX_EXPORTACIONES_BYTES
+from exportador import (
+    ESTILO_ENCABEZADO, FORMATOS_EXPORTACION, exportar_excel, exportar_tabla,
+    formatos_disponibles, renombrar_display,
+)
+import cache_store
+from utils import estadisticas_cache_ciudades
 import io
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Optional
 import os  # ← IMPORTANTE: Para crear carpetas
@@ -87,10 +99,11 @@ def _preparar_datos_para_click(df_filtrado: pd.DataFrame, columnas_clave: List[s
     Returns:
         DataFrame con columna adicional '_click_id' para tracking
     """
-    df_click = df_filtrado.copy()  # Evitar modificar el original
+    # assign: nuevo DataFrame que comparte las columnas existentes (sin copiar el original)
     # Concatenar valores de columnas clave como string único por fila
-    df_click['_click_id'] = df_click[columnas_clave].astype(str).agg('_'.join, axis=1)
-    return df_click
+    return df_filtrado.assign(
+        _click_id=df_filtrado[columnas_clave].astype(str).agg('_'.join, axis=1)
+    )
 
 
 # ──────────────────────────────────────────────────────────────────────────
@@ -100,7 +113,8 @@ def mostrar_datos_fuente(
     df_filtrado: pd.DataFrame, 
     seleccion: Dict, 
     columnas_filtro: List[tuple], 
-    titulo_seccion: str = "🔍 Datos Fuente"
+    titulo_seccion: str = "🔍 Datos Fuente",
+    clave_seleccion: Optional[tuple] = None
 ) -> None:
     """
     Muestra en un expandable los registros que generaron el elemento clickeado.
@@ -110,6 +124,7 @@ def mostrar_datos_fuente(
         seleccion: Dict con información del punto seleccionado (de on_select)
         columnas_filtro: Lista de tuplas [(col_df, valor_seleccion)] para filtrar
         titulo_seccion: Título personalizado para la sección de datos
+        clave_seleccion: Clave de la selección global, para cachear la exportación
     """
     # Validar que haya una selección válida con puntos
     if not seleccion or 'points' not in seleccion or not seleccion['points']:
@@ -120,7 +135,7 @@ def mostrar_datos_fuente(
     # Solo procesar si el punto tiene customdata (metadatos del gráfico)
     if 'customdata' in punto:
         with st.expander(titulo_seccion, expanded=True):
-            df_resultado = df_filtrado.copy()  # Copia para no alterar original
+            df_resultado = df_filtrado  # Los filtros crean DataFrames nuevos: el original no se altera
             
             # Aplicar filtros dinámicos según los valores del punto clickeado
             for i, (col, _) in enumerate(columnas_filtro):
@@ -149,17 +164,20 @@ def mostrar_datos_fuente(
                 hide_index=True
             )
             
-            # Botón de exportación a Excel si hay datos
+            # Botón de exportación si hay datos (se genera solo al hacer clic)
             if len(df_resultado) > 0:
-                buf = io.BytesIO()  # Buffer en memoria para el archivo
-                df_resultado.to_excel(buf, index=False, sheet_name='Datos_Fuente')
-                buf.seek(0)  # Reiniciar posición del buffer para lectura
-                
+                formato = selector_formato(f"formato_{titulo_seccion}")
+                clave = None
+                if clave_seleccion is not None:
+                    valores = tuple(str(v) for v in punto['customdata'][:len(columnas_filtro)])
+                    clave = (clave_seleccion, 'datos_fuente', tuple(c for c, _ in columnas_filtro), valores, formato)
                 st.download_button(
                     "📥 Exportar estos datos",
-                    data=buf,
-                    file_name="datos_fuente_seleccion.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    data=exportacion_diferida(
+                        clave, lambda: exportar_tabla(df_resultado, formato, 'Datos_Fuente')
+                    ),
+                    file_name=f"datos_fuente_seleccion.{formato}",
+                    mime=FORMATOS_EXPORTACION[formato]['mime']
                 )
 
 
@@ -280,20 +298,314 @@ def fig_base() -> Dict:
 # ──────────────────────────────────────────────────────────────────────────
 # 📥 CARGA Y PROCESAMIENTO DE DATOS (CON CACHE PARA RENDIMIENTO)
 # ──────────────────────────────────────────────────────────────────────────
-@st.cache_data(show_spinner=False, ttl=3600)  # Cache por 1 hora para evitar reprocesar
+# Pipeline por etapas, cada una memoizada por separado:
+#   1. Lectura del libro          → _etapa_lectura(digest)
+#   2. Limpieza / normalización   → _etapa_limpieza(digest)           (+ caché en disco)
+#      (un libro: _etapa_instantanea, incremental respecto a la versión cargada antes;
+#       varios libros: _etapa_consolidacion limpia cada uno en paralelo y los une)
+#   3. Matriz what-if SLA         → _etapa_matriz_sla(digest)         (todas las combinaciones)
+#   4. Evaluación SLA             → _cargar_df_nuclear_v7(digest, SLA)
+#   +  Índice de filtros          → _etapa_indice_filtros(digest)     (bitmaps por valor)
+#   +  Cubo de cumplimiento       → _etapa_cubo(digest, SLA)           (KPIs sin recorrer filas)
+# Mover un slider SLA solo consulta la matriz precalculada (sin reprocesar).
+#
+# Las etapas se identifican por el digest del archivo (huella_archivo), calculado
+# una sola vez por carga. El archivo viaja en el parámetro `_archivo`, que
+# Streamlit no hashea (prefijo "_"), y solo se lee cuando una etapa no está en caché.
+MAX_HUELLAS_SESION = 32  # Huellas de archivos recordadas por sesión
+MAX_INSTANTANEAS_SESION = 8  # Versiones previas de libros (por nombre) recordadas por sesión
+
+
+class CargaMultiple:
+    """
+    Varios libros subidos juntos (p. ej. "TECU 2026 Indicadores" y "TECU Aura").
+    Ocupa el lugar del archivo en las etapas: se limpian en paralelo y se
+    consolidan en un solo dataset (ver _etapa_consolidacion).
+    """
+
+    def __init__(self, archivos: list, huellas: list):
+        self.archivos = archivos
+        self.huellas = huellas
+        self.name = ' + '.join(a.name for a in archivos)
+        # El orden de carga es parte de la huella: define qué libro gana en los duplicados
+        self.huella = cache_store.digest_bytes('|'.join(huellas).encode())
+
+
+def huella_archivo(uploaded_file) -> str:
+    """
+    Digest SHA-256 del archivo subido, calculado una vez por carga.
+    
+    Se guarda en st.session_state bajo el file_id del uploader, de modo que
+    los reruns (clicks en gráficos, filtros, sliders) no vuelven a recorrer
+    el contenido del archivo.
+    """
+    if isinstance(uploaded_file, CargaMultiple):
+        return uploaded_file.huella
+    id_carga = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}:{uploaded_file.size}"
+    huellas = st.session_state.setdefault('huellas_archivos', {})
+    if id_carga not in huellas:
+        huellas[id_carga] = cache_store.digest_bytes(uploaded_file.getvalue())
+        logger.info(f"Huella de archivo calculada: {uploaded_file.name} → {huellas[id_carga][:12]}")
+        while len(huellas) > MAX_HUELLAS_SESION:
+            huellas.pop(next(iter(huellas)))
+    return huellas[id_carga]
+
+
+def preparar_carga(subidos: list):
+    """Archivo único tal cual, o CargaMultiple (en orden de carga) si son varios."""
+    if len(subidos) == 1:
+        return subidos[0]
+    return CargaMultiple(subidos, [huella_archivo(a) for a in subidos])
+
+
+@st.cache_data(show_spinner=False, ttl=3600)  # Cache por 1 hora para evitar releer
+def _etapa_lectura(digest: str, nombre_archivo: str, _archivo) -> tuple:
+    """
+    Etapa 1: lee la hoja de datos del libro (una sola pasada).
+    
+    Args:
+        digest: Huella del contenido (clave de caché)
+        nombre_archivo: Nombre original del archivo (define el motor de lectura)
+        _archivo: Archivo subido (objeto con getvalue()); no forma parte de la clave
+    
+    Returns:
+        Tupla (DataFrame crudo, nombre de hoja usada)
+    """
+    logger.info(f"Iniciando carga de archivo: {nombre_archivo}")
+    # 📖 Lectura en una sola pasada con el motor más rápido instalado (calamine → openpyxl)
+    df, hoja = cargar_libro(_archivo.getvalue(), nombre_archivo)
+    logger.info(f"DataFrame cargado: {len(df)} filas, {len(df.columns)} columnas")
+    return df, hoja
+
+
+@st.cache_resource(show_spinner=False, ttl=3600)  # DataFrame compartido (solo lectura), sin copiar por rerun
+def _etapa_limpieza(digest: str, nombre_archivo: str, _archivo) -> tuple:
+    """
+    Etapa 2: limpieza y normalización (independiente de los parámetros SLA).
+    
+    Returns:
+        Tupla (DataFrame limpio, nombre de hoja usada)
+    """
+    if isinstance(_archivo, CargaMultiple):
+        df_limpio, hoja, _ = _etapa_consolidacion(digest, nombre_archivo, _archivo)
+        return df_limpio, hoja
+    instantanea, hoja = _etapa_instantanea(digest, nombre_archivo, _archivo)
+    return instantanea.df_limpio, hoja
+
+
+@st.cache_resource(show_spinner=False, ttl=3600)  # Instantánea compartida (solo lectura), sin copiar por rerun
+def _etapa_instantanea(digest: str, nombre_archivo: str, _archivo, _anterior: InstantaneaLimpieza = None) -> tuple:
+    """
+    Etapa 2 con un libro: limpieza incremental respecto a la instantánea de la
+    versión cargada antes (`_anterior`, no forma parte de la clave): solo las
+    filas nuevas o modificadas pasan por la limpieza. El resultado no depende
+    de `_anterior`, por eso puede compartirse entre sesiones.
+    
+    Returns:
+        Tupla (InstantaneaLimpieza, nombre de hoja usada)
+    """
+    return _limpiar_libro(
+        digest, nombre_archivo, lambda: _etapa_lectura(digest, nombre_archivo, _archivo), _anterior
+    )
+
+
+def _limpiar_libro(digest: str, nombre_archivo: str, leer, anterior: InstantaneaLimpieza = None) -> tuple:
+    """
+    Limpieza de un libro con caché en disco (mismo contenido + misma versión
+    del procesador). No usa st.*: puede ejecutarse en hilos de trabajo.
+    
+    Args:
+        leer: Función sin argumentos que retorna (DataFrame crudo, hoja)
+        anterior: Instantánea de la versión previa del libro (limpieza incremental)
+    
+    Returns:
+        Tupla (InstantaneaLimpieza, nombre de hoja usada)
+    """
+    clave = cache_store.clave_cache(digest)
+    en_disco = cache_store.leer(clave)
+    if en_disco is not None:
+        df_limpio, meta = en_disco
+        columnas = tuple(tuple(c) for c in meta['columnas']) if 'columnas' in meta else None
+        return InstantaneaLimpieza(df_limpio, meta.get('huellas'), columnas), meta.get('hoja')
+
+    df, hoja = leer()
+    instantanea = DataProcessor(df).limpiar_incremental(anterior)
+    df_limpio = instantanea.df_limpio
+    cambios = instantanea.cambios_desde(anterior)
+    if cambios is not None:
+        logger.info(
+            f"Limpieza incremental ({nombre_archivo}): {cambios['nuevas']} nuevas, "
+            f"{cambios['modificadas']} modificadas, {cambios['sin_cambios']} sin cambios"
+        )
+    logger.info(f"Limpieza completada ({nombre_archivo}): {len(df_limpio)} registros válidos")
+
+    cache_store.guardar(
+        clave, df_limpio, {'hoja': hoja, 'archivo': nombre_archivo, 'columnas': instantanea.columnas},
+        huellas=instantanea.huellas,
+    )
+    return instantanea, hoja
+
+
+@st.cache_resource(show_spinner=False, ttl=3600)  # DataFrame compartido (solo lectura), sin copiar por rerun
+def _etapa_consolidacion(digest: str, nombre_archivo: str, _archivo: CargaMultiple) -> tuple:
+    """
+    Etapa 2 con varios libros: lectura y limpieza de cada libro en paralelo
+    (un hilo por libro distinto) y unión con deduplicación por pedido
+    (DataProcessor.combinar_limpios: el último libro cargado gana).
+    
+    Returns:
+        Tupla (DataFrame limpio consolidado, hojas usadas, resumen de la consolidación)
+    """
+    # Libros idénticos (misma huella) se limpian una sola vez
+    libros = {}
+    for archivo, huella in zip(_archivo.archivos, _archivo.huellas):
+        libros.setdefault(huella, archivo)
+
+    def limpiar(huella):
+        archivo = libros[huella]
+        try:
+            instantanea, hoja = _limpiar_libro(
+                huella, archivo.name, lambda: cargar_libro(archivo.getvalue(), archivo.name)
+            )
+            return instantanea.df_limpio, hoja
+        except Exception as e:
+            raise ValueError(f"{archivo.name}: {e}") from e
+
+    with ThreadPoolExecutor(max_workers=min(len(libros), os.cpu_count() or 1)) as pool:
+        limpios = dict(zip(libros, pool.map(limpiar, libros)))
+
+    df_limpio, resumen = DataProcessor.combinar_limpios([limpios[h][0] for h in _archivo.huellas])
+    hojas = ', '.join(dict.fromkeys(str(limpios[h][1]) for h in _archivo.huellas))
+    logger.info(
+        f"Consolidación: {resumen['archivos']} libros, {resumen['filas_leidas']} filas → "
+        f"{len(df_limpio)} ({resumen['pedidos_repetidos']} pedidos repetidos, "
+        f"{resumen['filas_reemplazadas']} filas reemplazadas)"
+    )
+    return df_limpio, hojas, resumen
+
+
+@st.cache_resource(show_spinner=False, ttl=3600)  # Objeto compartido (solo lectura), sin copiar por rerun
+def _etapa_matriz_sla(digest: str, nombre_archivo: str, _archivo):
+    """
+    Etapa 3: desvíos y cumplimiento para todas las combinaciones de los sliders SLA.
+    
+    Returns:
+        MatrizSLA sobre el DataFrame limpio
+    """
+    df_limpio, _ = _etapa_limpieza(digest, nombre_archivo, _archivo)
+    matriz = DataProcessor.matriz_sla(df_limpio)
+    logger.info(
+        f"Matriz SLA precalculada: {len(df_limpio)} registros × "
+        f"{len(RANGO_SLA_ALMACEN) * len(RANGO_SLA_PRINCIPAL) * len(RANGO_SLA_OTRAS)} combinaciones"
+    )
+    return matriz
+
+
+@st.cache_resource(show_spinner=False, ttl=3600)  # Objeto compartido (solo lectura), sin copiar por rerun
+def _etapa_indice_filtros(digest: str, nombre_archivo: str, _archivo) -> IndiceFiltros:
+    """
+    Índice de filtros del sidebar (independiente del SLA: mismas filas y orden).
+    
+    Returns:
+        IndiceFiltros sobre el DataFrame limpio
+    """
+    df_limpio, _ = _etapa_limpieza(digest, nombre_archivo, _archivo)
+    return IndiceFiltros(df_limpio)
+
+
+@st.cache_resource(show_spinner=False, ttl=3600)  # Objeto compartido (solo lectura), sin copiar por rerun
+def _etapa_cubo(digest: str, nombre_archivo: str, _archivo, sla: tuple):
+    """
+    Cubo de agregados de cumplimiento para una combinación SLA: los KPIs y
+    análisis por ciudad/transportadora/mes se responden sumando celdas.
+    
+    Returns:
+        CuboCumplimiento sobre el DataFrame procesado, o None si falla el procesamiento
+    """
+    df_procesado, _ = _cargar_df_nuclear_v7(digest, nombre_archivo, _archivo, *sla)
+    if df_procesado is None:
+        return None
+    cubo = DataProcessor.construir_cubo(df_procesado)
+    logger.info(f"Cubo de cumplimiento: {len(df_procesado)} registros → {len(cubo)} celdas")
+    return cubo
+
+
+@st.cache_resource(show_spinner=False)
+def _cache_selecciones() -> CacheLRU:
+    """
+    Caché LRU compartida (por tamaño) de filas filtradas, DataFrames filtrados
+    (solo lectura) y agregados derivados.
+    Clave: (digest, parámetros SLA, selección de filtros normalizada).
+    """
+    return CacheLRU()
+
+
+@st.cache_resource(show_spinner=False)
+def _cache_exportaciones() -> CacheLRU:
+    """
+    Caché LRU de archivos exportados (bytes), separada de la de selecciones
+    para que los reportes pesados no desplacen filas y agregados.
+    Clave: (clave de selección, tipo de exportación, parámetros propios).
+    """
+    return CacheLRU(max_bytes=TAMANO_MAX_EXPORTACIONES_BYTES)
+
+
+def exportacion_diferida(clave, construir):
+    """
+    Envuelve la construcción de un archivo de descarga para st.download_button.
+
+    Streamlit ejecuta el callable solo al hacer clic y fuera del render, así
+    que los reruns por filtros no generan archivos. El resultado se cachea
+    por clave; con clave None se genera en cada descarga sin cachear.
+
+    Args:
+        clave: Tupla hashable (clave de selección, tipo, parámetros) o None
+        construir: Función sin argumentos que retorna BytesIO o bytes
+
+    Returns:
+        Callable sin argumentos que retorna los bytes del archivo
+    """
+    cache = _cache_exportaciones()  # Se resuelve en el hilo del script
+
+    def generar() -> bytes:
+        def a_bytes():
+            contenido = construir()
+            return contenido.getvalue() if isinstance(contenido, io.BytesIO) else contenido
+        try:
+            return a_bytes() if clave is None else cache.obtener(clave, a_bytes)
+        except Exception as e:
+            logger.error(f"Error generando exportación {clave!r}: {e}", exc_info=True)
+            raise
+
+    return generar
+
+
+def selector_formato(clave_widget: str, contenedor=st) -> str:
+    """Selector del formato de descarga (Parquet solo si pyarrow está instalado)."""
+    return contenedor.selectbox(
+        "Formato",
+        formatos_disponibles(),
+        format_func=lambda f: FORMATOS_EXPORTACION[f]['etiqueta'],
+        key=clave_widget,
+    )
+
+
+@st.cache_resource(show_spinner=False, ttl=3600)  # DataFrame compartido (solo lectura), sin copiar por rerun
 def _cargar_df_nuclear_v7(
-    archivo_bytes: bytes, 
+    digest: str, 
     nombre_archivo: str, 
+    _archivo, 
     sla_almacen: int = 1, 
     sla_principal: int = 3, 
     sla_otras: int = 5
 ) -> tuple:
     """
-    Función interna con cache para cargar y procesar archivo Excel.
+    Etapa 4: aplica los parámetros SLA consultando la matriz precalculada.
     
     Args:
-        archivo_bytes: Contenido binario del archivo subido
+        digest: Huella del contenido del archivo (ver huella_archivo)
         nombre_archivo: Nombre original del archivo (para logs)
+        _archivo: Archivo subido; solo se lee si alguna etapa no está en caché
         sla_almacen: Días máximos para despacho desde almacén
         sla_principal: SLA para ciudades principales (Bogotá, Medellín, Cali)
         sla_otras: SLA para otras ciudades
@@ -301,52 +613,18 @@ def _cargar_df_nuclear_v7(
     Returns:
         Tupla (DataFrame procesado, nombre de hoja usada) o (None, None) si error
     """
-    logger.info(f"Iniciando carga de archivo: {nombre_archivo}")
-    
     try:
-        # Leer archivo Excel desde bytes en memoria
-        xl = pd.ExcelFile(io.BytesIO(archivo_bytes))
-
-        # 🔍 Detectar automáticamente la hoja con datos (flexible a nombres variados)
-        hoja = None
-        for h in xl.sheet_names:
-            if any(kw in h.lower() for kw in ['venta', 'base', 'despacho']):
-                hoja = h
-                logger.info(f"Hoja detectada: {hoja}")
-                break
-        if hoja is None:
-            hoja = xl.sheet_names[0]  # Fallback: usar primera hoja
-            logger.warning(f"Usando hoja por defecto: {hoja}")
-
-        # 🔍 Detectar fila de encabezado dinámicamente (robusto a formatos)
-        df_raw = pd.read_excel(
-            io.BytesIO(archivo_bytes), 
-            sheet_name=hoja, 
-            header=None, 
-            nrows=10  # Leer solo primeras 10 filas para detectar header
-        )
-        header_row = 0
-        for i in range(len(df_raw)):
-            # Buscar palabras clave que indiquen fila de encabezado
-            row_vals = ' '.join([str(v).lower() for v in df_raw.iloc[i].values])
-            if any(kw in row_vals for kw in ['fecha', 'cliente', 'ciudad', 'no orden']):
-                header_row = i
-                logger.info(f"Fila de encabezado detectada: {header_row}")
-                break
-
-        # Leer DataFrame completo con encabezado detectado
-        df = pd.read_excel(
-            io.BytesIO(archivo_bytes), 
-            sheet_name=hoja, 
-            header=header_row
-        )
-        logger.info(f"DataFrame cargado: {len(df)} filas, {len(df.columns)} columnas")
+        _, hoja = _etapa_limpieza(digest, nombre_archivo, _archivo)
 
-        # 🔄 Procesar datos con parámetros de SLA configurados
-        from data_processor import DataProcessor as _DP
-        p = _DP(df)
-        df_procesado = p.procesar(sla_almacen, sla_principal, sla_otras)
+        # 🔄 Solo columnas dependientes del SLA: desvíos (consulta a la matriz), Cumple_NNS, área
+        matriz = _etapa_matriz_sla(digest, nombre_archivo, _archivo)
+        df_procesado = matriz.aplicar(sla_almacen, sla_principal, sla_otras)
         logger.info(f"Procesamiento completado: {len(df_procesado)} registros válidos")
+        memoria = DataProcessor.memoria_esquema(df_procesado)
+        logger.info(
+            f"Esquema compacto: {memoria['con_esquema_mb']} MB "
+            f"(sin compactar {memoria['sin_esquema_mb']} MB, ahorro {memoria['ahorro_pct']}%)"
+        )
         
         return df_procesado, hoja
 
@@ -356,6 +634,31 @@ def _cargar_df_nuclear_v7(
         return None, None
 
 
+def _registrar_version(uploaded_file, digest: str) -> None:
+    """
+    Nueva versión de un libro: se limpia de forma incremental respecto a la
+    versión cargada antes en esta sesión con el mismo nombre de archivo.
+    
+    La instantánea previa y el conteo de cambios se guardan en st.session_state
+    (por sesión y por nombre), no en la instantánea compartida de caché.
+    """
+    versiones = st.session_state.setdefault('versiones_libros', {})
+    previa = versiones.get(uploaded_file.name)
+    if previa is not None and previa['digest'] == digest:
+        return  # Misma versión (rerun): se conservan instantánea y cambios
+    
+    anterior = previa['instantanea'] if previa is not None else None
+    instantanea, _ = _etapa_instantanea(digest, uploaded_file.name, uploaded_file, anterior)
+    versiones.pop(uploaded_file.name, None)  # Reinsertar al final: la más reciente
+    versiones[uploaded_file.name] = {
+        'digest': digest,
+        'instantanea': instantanea,
+        'cambios': instantanea.cambios_desde(anterior),
+    }
+    while len(versiones) > MAX_INSTANTANEAS_SESION:
+        versiones.pop(next(iter(versiones)))
+
+
 def cargar_y_procesar(
     uploaded_file, 
     sla_almacen: int = 1, 
@@ -372,15 +675,22 @@ def cargar_y_procesar(
     Returns:
         Tupla (processor, df_procesado, hoja) o (None, None, None) si error
     """
-    archivo_bytes = uploaded_file.getvalue()  # Convertir a bytes para cache
+    digest = huella_archivo(uploaded_file)  # Una vez por carga, no por rerun
+    if not isinstance(uploaded_file, CargaMultiple):
+        try:
+            _registrar_version(uploaded_file, digest)
+        except Exception as e:
+            logger.error(f"Error crítico al cargar archivo: {str(e)}", exc_info=True)
+            st.error(f"❌ Error al procesar el archivo: {e}")
+            return None, None, None
     df_procesado, hoja = _cargar_df_nuclear_v7(
-        archivo_bytes, uploaded_file.name, sla_almacen, sla_principal, sla_otras
+        digest, uploaded_file.name, uploaded_file, sla_almacen, sla_principal, sla_otras
     )
     
     if df_procesado is None:
         return None, None, None
     
-    # Crear instancia fresca de DataProcessor con datos ya procesados
+    # Instancia de DataProcessor sobre los datos ya procesados (compartidos, sin copia)
     processor = DataProcessor(df_procesado)
     processor.df_procesado = df_procesado  # Asignar para acceso directo
     
@@ -390,33 +700,39 @@ def cargar_y_procesar(
 # ──────────────────────────────────────────────────────────────────────────
 # 🎛️ SIDEBAR: FILTROS GLOBALES Y CONFIGURACIÓN
 # ──────────────────────────────────────────────────────────────────────────
-def sidebar_filtros(df_procesado: pd.DataFrame) -> tuple:
+def sidebar_filtros(
+    df_procesado: pd.DataFrame, 
+    indice: IndiceFiltros = None, 
+    clave_dataset: tuple = None
+) -> tuple:
     """
     Renderiza sidebar con filtros globales y retorna DataFrame filtrado.
     
     Args:
         df_procesado: DataFrame original procesado
+        indice: Índice de filtros del dataset (se construye si no se entrega)
+        clave_dataset: Tupla (digest, parámetros SLA) para la caché de selecciones
         
     Returns:
-        Tupla (df_filtrado, debug_mode) con datos aplicando filtros y flag de debug
+        Tupla (df_filtrado, debug_mode, clave_seleccion): datos filtrados, flag de
+        debug y clave de caché de la selección actual
     """
     st.sidebar.markdown("## 📦 TECU Despachos")
     st.sidebar.markdown("---")
 
-    df_f = df_procesado.copy()  # Trabajar sobre copia para no alterar original
-    total_rows = len(df_procesado)
+    total_rows = len(df_procesado) if df_procesado is not None else 0
 
     if df_procesado is None or total_rows == 0:
-        return df_f, False
+        return df_procesado, False, (clave_dataset, ())
+
+    # Opciones y máscaras por valor salen del índice (sin copiar el DataFrame)
+    if indice is None:
+        indice = IndiceFiltros(df_procesado)
 
     st.sidebar.markdown("### 🔍 Filtros Globales")
 
-    # ── 📅 FILTRO POR MES (con mapeo seguro para orden cronológico) ──
-    # Crear diccionario de mapeo Mes_Sort (numérico) → Mes_Label (legible)
-    df_meses = df_f[['Mes_Sort', 'Mes_Label']].dropna().drop_duplicates().sort_values('Mes_Sort')
-    mapa_mes = dict(zip(df_meses['Mes_Sort'].astype(str), df_meses['Mes_Label'].astype(str)))
-    
-    opciones_mes = list(mapa_mes.values())  # Opciones legibles para el usuario
+    # ── 📅 FILTRO POR MES (opciones en orden cronológico según Mes_Sort) ──
+    opciones_mes = indice.opciones_de('Mes_Label')  # Opciones legibles para el usuario
     sel_mes = st.sidebar.multiselect(
         "📅 Mes",
         options=['Todos'] + opciones_mes,
@@ -426,7 +742,7 @@ def sidebar_filtros(df_procesado: pd.DataFrame) -> tuple:
     )
 
     # ── 🚚 FILTRO POR TRANSPORTADORA ──
-    opciones_transp = sorted(df_f['Transportadora'].dropna().unique().astype(str).tolist())
+    opciones_transp = indice.opciones_de('Transportadora')
     sel_transp = st.sidebar.multiselect(
         "🚚 Transportadora",
         options=['Todas'] + opciones_transp,
@@ -436,7 +752,7 @@ def sidebar_filtros(df_procesado: pd.DataFrame) -> tuple:
     )
 
     # ── 📍 FILTRO POR CIUDAD ──
-    opciones_ciudad = sorted(df_f['Ciudad'].dropna().unique().astype(str).tolist())
+    opciones_ciudad = indice.opciones_de('Ciudad')
     sel_ciudad = st.sidebar.multiselect(
         "📍 Ciudad",
         options=['Todas'] + opciones_ciudad,
@@ -446,8 +762,8 @@ def sidebar_filtros(df_procesado: pd.DataFrame) -> tuple:
     )
 
     # ── 📦 NUEVO: FILTRO POR CATEGORÍA DE PRODUCTO ──
-    if 'Categoria' in df_f.columns:
-        opciones_cat = sorted(df_f['Categoria'].dropna().unique().astype(str).tolist())
+    if indice.tiene('Categoria'):
+        opciones_cat = indice.opciones_de('Categoria')
         sel_cat = st.sidebar.multiselect(
             "📦 Categoría",
             options=['Todas'] + opciones_cat,
@@ -459,8 +775,8 @@ def sidebar_filtros(df_procesado: pd.DataFrame) -> tuple:
         sel_cat = ['Todas']  # Fallback si columna no existe
 
     # ── 🏷️ NUEVO: FILTRO POR CONCEPTO (Venta vs Novedad) ──
-    if 'Concepto' in df_f.columns:
-        opciones_concepto = sorted(df_f['Concepto'].dropna().unique().astype(str).tolist())
+    if indice.tiene('Concepto'):
+        opciones_concepto = indice.opciones_de('Concepto')
         sel_concepto = st.sidebar.multiselect(
             "🏷️ Concepto",
             options=['Todos'] + opciones_concepto,
@@ -471,53 +787,44 @@ def sidebar_filtros(df_procesado: pd.DataFrame) -> tuple:
     else:
         sel_concepto = ['Todos']
 
-    # ── 💰 NUEVO: FILTRO POR RANGO DE VALOR DESPACHO ──
-    if 'Valor despacho' in df_f.columns:
-        # Limpiar y convertir valores monetarios a numéricos
-        df_f['Valor_num'] = pd.to_numeric(
-            df_f['Valor despacho'].astype(str).str.replace(r'[^\d.]', '', regex=True), 
-            errors='coerce'
-        ).fillna(0)
-        
-        min_val, max_val = df_f['Valor_num'].min(), df_f['Valor_num'].max()
+    # ── 💰 NUEVO: FILTRO POR RANGO DE VALOR DESPACHO (Valor_num normalizado en limpieza) ──
+    limites_valor = indice.rango_valor()
+    if limites_valor is not None and limites_valor[0] < limites_valor[1]:
+        min_val, max_val = limites_valor
         rango_valor = st.sidebar.slider(
             "💰 Rango Valor Despacho (COP)",
-            min_value=float(min_val), 
-            max_value=float(max_val),
-            value=(float(min_val), float(max_val)),
+            min_value=min_val, 
+            max_value=max_val,
+            value=(min_val, max_val),
             key='slider_valor',
             help="Filtra por monto del despacho en pesos colombianos"
         )
     else:
-        rango_valor = (0, float('inf'))  # Sin filtro si columna no existe
-
-    # ── 🔄 APLICAR TODOS LOS FILTROS AL DATAFRAME ──
-    # Filtro por Mes (comparación directa de labels para evitar errores de mapeo)
-    if 'Todos' not in sel_mes and len(sel_mes) > 0:
-        df_f = df_f[df_f['Mes_Label'].astype(str).isin(sel_mes)]
-
-    # Filtro por Transportadora
-    if 'Todas' not in sel_transp and len(sel_transp) > 0:
-        df_f = df_f[df_f['Transportadora'].astype(str).isin(sel_transp)]
-
-    # Filtro por Ciudad
-    if 'Todas' not in sel_ciudad and len(sel_ciudad) > 0:
-        df_f = df_f[df_f['Ciudad'].astype(str).isin(sel_ciudad)]
-
-    # Filtro por Categoría (NUEVO)
-    if 'Categoria' in df_f.columns and 'Todas' not in sel_cat and len(sel_cat) > 0:
-        df_f = df_f[df_f['Categoria'].astype(str).isin(sel_cat)]
-
-    # Filtro por Concepto (NUEVO)
-    if 'Concepto' in df_f.columns and 'Todos' not in sel_concepto and len(sel_concepto) > 0:
-        df_f = df_f[df_f['Concepto'].astype(str).isin(sel_concepto)]
-
-    # Filtro por Rango de Valor (NUEVO)
-    if 'Valor_num' in df_f.columns:
-        df_f = df_f[
-            (df_f['Valor_num'] >= rango_valor[0]) & 
-            (df_f['Valor_num'] <= rango_valor[1])
-        ]
+        rango_valor = None  # Sin filtro si columna no existe
+
+    # ── 🔄 APLICAR TODOS LOS FILTROS: intersección de bitmaps, una sola materialización ──
+    # 'Todos'/'Todas' o selección vacía = sin filtro en esa dimensión
+    selecciones = {
+        'Mes_Label': [] if 'Todos' in sel_mes else sel_mes,
+        'Transportadora': [] if 'Todas' in sel_transp else sel_transp,
+        'Ciudad': [] if 'Todas' in sel_ciudad else sel_ciudad,
+        'Categoria': [] if 'Todas' in sel_cat else sel_cat,
+        'Concepto': [] if 'Todos' in sel_concepto else sel_concepto,
+    }
+    clave_seleccion = (clave_dataset, indice.clave(selecciones, rango_valor))
+    if clave_dataset is None:
+        df_f = indice.filtrar(df_procesado, selecciones, rango_valor)
+    else:
+        # ♻️ Filas y DataFrame filtrado en caché LRU: volver a una selección previa (o un
+        # rerun sin cambios de filtro) no recalcula la máscara ni vuelve a materializar filas
+        cache = _cache_selecciones()
+        filas = cache.obtener(
+            (clave_seleccion, 'filas'), lambda: indice.filas(selecciones, rango_valor)
+        )
+        if len(filas) == total_rows:
+            df_f = df_procesado  # Sin filtro efectivo: se comparte el DataFrame procesado
+        else:
+            df_f = cache.obtener((clave_seleccion, 'df'), lambda: df_procesado.take(filas))
 
     # ── 🛠️ HERRAMIENTAS DE DESARROLLO Y UTILIDAD ──
     st.sidebar.markdown("---")
@@ -534,13 +841,36 @@ def sidebar_filtros(df_procesado: pd.DataFrame) -> tuple:
     curr_rows = len(df_f)
     st.sidebar.caption(f"📊 Registros: {curr_rows:,} / {total_rows:,}")
     
+    # Tasas de acierto de la caché de normalización de ciudades (solo en modo debug)
+    if debug_mode:
+        stats_ciudades = estadisticas_cache_ciudades()
+        st.sidebar.caption(
+            "🏙️ Caché ciudades: " + " · ".join(
+                f"{nombre} {s['tasa_aciertos']}% ({s['entradas']} entradas)"
+                for nombre, s in stats_ciudades.items()
+            )
+        )
+        stats_sel = _cache_selecciones().estadisticas()
+        st.sidebar.caption(
+            f"♻️ Caché selecciones: {stats_sel['aciertos']} aciertos · {stats_sel['fallos']} fallos "
+            f"({stats_sel['tasa_aciertos']}%) · {stats_sel['entradas']} entradas · "
+            f"{stats_sel['mb_usados']} MB · {stats_sel['descartes']} descartes"
+        )
+        memoria = DataProcessor.memoria_esquema(df_procesado)
+        st.sidebar.caption(
+            f"🧮 Esquema compacto: {memoria['con_esquema_mb']} MB en memoria "
+            f"(sin compactar {memoria['sin_esquema_mb']} MB · −{memoria['ahorro_mb']} MB, "
+            f"{memoria['ahorro_pct']}%)"
+        )
+    
     # Botón para limpiar cache y recargar app (útil en desarrollo)
     if st.sidebar.button("🔄 Reiniciar App (Borrar Caché)"):
         st.cache_data.clear()
+        st.cache_resource.clear()
         logger.info("Cache limpiado por usuario - App reiniciada")
         st.rerun()
 
-    return df_f, debug_mode
+    return df_f, debug_mode, clave_seleccion
 
 
 # ──────────────────────────────────────────────────────────────────────────
@@ -659,10 +989,63 @@ def mostrar_kpis(ind_global: Dict, ind_filtrado: Dict, etiqueta_filtro: str = "S
         _fila_kpis_financieros(st.session_state.df_filtrado_actual)
 
 
+def mostrar_sensibilidad_sla(matriz, df_filtrado: pd.DataFrame, sla_actual: tuple) -> None:
+    """
+    Vista "Sensibilidad SLA": cumplimiento y desvíos para todas las combinaciones
+    de los sliders, calculados sobre la selección actual desde la matriz precalculada.
+    
+    Args:
+        matriz: MatrizSLA del archivo cargado
+        df_filtrado: DataFrame con datos filtrados por el usuario
+        sla_actual: Tupla (almacén, principal, otras) seleccionada en el sidebar
+    """
+    with st.expander("🧪 Sensibilidad SLA (¿qué pasaría si…?)", expanded=False):
+        # Posiciones de la selección dentro del DataFrame limpio (mismo índice)
+        posiciones = matriz.df_limpio.index.get_indexer(df_filtrado.index)
+        resumen = matriz.resumen(posiciones)
+        sl_alm, sl_pri, sl_otr = sla_actual
+        
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            # El cumplimiento de entrega no depende del límite de almacén
+            entrega = resumen[resumen['SLA_Almacen'] == sl_alm]
+            tabla = entrega.pivot(index='SLA_Principal', columns='SLA_Otras', values='Pct_Cumplimiento')
+            fig = px.imshow(
+                tabla, text_auto='.1f', aspect='auto', color_continuous_scale='RdYlGn',
+                labels={'x': 'SLA Otras Ciudades (días)', 'y': 'SLA Ciudades Principales (días)',
+                        'color': '% Cumplimiento'},
+                template=PLOTLY_TEMPLATE,
+            )
+            fig.update_layout(**fig_base(), height=320, title='% Cumplimiento NNS por combinación SLA')
+            st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            despacho = resumen.drop_duplicates('SLA_Almacen')[
+                ['SLA_Almacen', 'Con_Desvio_Despacho', 'Prom_Desvio_Despacho']
+            ]
+            st.markdown("**📦 Desvío de despacho por límite de almacén**")
+            st.dataframe(despacho, hide_index=True, use_container_width=True)
+        
+        actual = resumen[
+            (resumen['SLA_Almacen'] == sl_alm) & (resumen['SLA_Principal'] == sl_pri)
+            & (resumen['SLA_Otras'] == sl_otr)
+        ]
+        if not actual.empty:
+            st.caption(
+                f"Configuración actual ({sl_alm}/{sl_pri}/{sl_otr} días): "
+                f"{actual['Pct_Cumplimiento'].iloc[0]}% de cumplimiento · "
+                f"rango posible {resumen['Pct_Cumplimiento'].min()}% – {resumen['Pct_Cumplimiento'].max()}%"
+            )
+
+
 # ──────────────────────────────────────────────────────────────────────────
 # 📈 GRÁFICOS INTERACTIVOS CON PLOTLY
 # ──────────────────────────────────────────────────────────────────────────
-def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = False) -> None:
+def mostrar_graficos(
+    processor, 
+    df_filtrado: pd.DataFrame, 
+    debug_mode: bool = False, 
+    clave_seleccion: Optional[tuple] = None
+) -> None:
     """
     Renderiza todos los gráficos interactivos del dashboard en layout responsivo.
     
@@ -670,6 +1053,7 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
         processor: Instancia de DataProcessor para métodos de análisis
         df_filtrado: DataFrame con datos filtrados por el usuario
         debug_mode: Flag para mostrar información de debugging en consola
+        clave_seleccion: Clave de la selección global, para cachear exportaciones
     """
     # Guardar df_filtrado en session_state para acceso en KPIs financieros
     st.session_state.df_filtrado_actual = df_filtrado
@@ -680,7 +1064,8 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
     with col1:
         st.markdown("### 🎯 Cumplimiento NNS")
         # Contar frecuencias de cada categoría de cumplimiento
-        counts = df_filtrado['Cumple_NNS'].value_counts().reset_index()
+        # (categorías sin pedidos en la selección fuera: Cumple_NNS es categórica)
+        counts = df_filtrado['Cumple_NNS'].value_counts().loc[lambda c: c > 0].reset_index()
         counts.columns = ['Categoria', 'Cantidad']
         
         # Gráfico de dona con Plotly Express (más simple para este caso)
@@ -708,7 +1093,8 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
         if sel_nns and 'selection' in sel_nns:
             mostrar_datos_fuente(df_filtrado, sel_nns['selection'], 
                                 [('Cumple_NNS', 'Categoria')], 
-                                titulo_seccion="🎯 Detalle de Pedidos por Cumplimiento")
+                                titulo_seccion="🎯 Detalle de Pedidos por Cumplimiento",
+                                clave_seleccion=clave_seleccion)
         else:
             st.caption("💡 Haz clic en una rodaja para ver el detalle")
 
@@ -767,7 +1153,8 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
         if sel_c and 'selection' in sel_c:
             mostrar_datos_fuente(df_filtrado, sel_c['selection'], 
                                 [('Ciudad', 'Ciudad')], 
-                                titulo_seccion="📍 Detalle de Pedidos por Ciudad")
+                                titulo_seccion="📍 Detalle de Pedidos por Ciudad",
+                                clave_seleccion=clave_seleccion)
         else:
             st.caption("💡 Haz clic en una barra para ver detalle")
 
@@ -809,7 +1196,8 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
             if sel_t and 'selection' in sel_t:
                 mostrar_datos_fuente(df_filtrado, sel_t['selection'], 
                                     [('Transportadora', 'Transportadora')], 
-                                    titulo_seccion="🚚 Detalle de Pedidos por Transportadora")
+                                    titulo_seccion="🚚 Detalle de Pedidos por Transportadora",
+                                    clave_seleccion=clave_seleccion)
             else:
                 st.caption("💡 Haz clic en una barra para ver detalle")
 
@@ -818,7 +1206,7 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
         inc = processor.get_pedidos_incumplimiento(df_filtrado)
         
         if inc is not None and len(inc) > 0 and 'Area_Incumple' in inc.columns:
-            areas = inc['Area_Incumple'].value_counts().reset_index()
+            areas = inc['Area_Incumple'].value_counts().loc[lambda c: c > 0].reset_index()
             areas.columns = ['Area', 'Cantidad']
             
             fig5 = px.pie(
@@ -837,7 +1225,8 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
             if sel_a and 'selection' in sel_a:
                 mostrar_datos_fuente(df_filtrado, sel_a['selection'], 
                                     [('Area_Incumple', 'Area')], 
-                                    titulo_seccion="🏢 Detalle de Responsabilidad")
+                                    titulo_seccion="🏢 Detalle de Responsabilidad",
+                                    clave_seleccion=clave_seleccion)
             else:
                 st.caption("💡 Haz clic para ver detalle del área")
         else:
@@ -888,17 +1277,11 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
     # ── NUEVO: FILA 5 - Análisis de Causas Raíz (Pareto) ──
     st.markdown("### 🎯 Análisis de Causas Raíz (Principio de Pareto)")
     
-    if 'Causal de Incumplimiento' in df_filtrado.columns:
-        # Filtrar solo pedidos que NO cumplieron para análisis de causas
-        df_inc = df_filtrado[df_filtrado['Cumple_NNS'] == 'No cumple'].copy()
+    if 'Causal_Incumplimiento' in df_filtrado.columns:
+        # Frecuencia de causales entre los pedidos que NO cumplieron (con % acumulado para Pareto)
+        causas = processor.get_analisis(df_filtrado, ['causal'])['causal']
         
-        if len(df_inc) > 0:
-            # Agrupar y contar frecuencias de cada causa
-            causas = df_inc['Causal de Incumplimiento'].value_counts().reset_index()
-            causas.columns = ['Causal', 'Frecuencia']
-            causas['Porcentaje'] = (causas['Frecuencia'] / causas['Frecuencia'].sum() * 100).round(1)
-            causas['Porcentaje Acum'] = causas['Porcentaje'].cumsum()  # Acumulado para curva Pareto
-            
+        if len(causas) > 0:
             # Crear gráfico combinado: barras (frecuencia) + línea (% acumulado)
             fig_pareto = go.Figure()
             fig_pareto.add_trace(go.Bar(
@@ -907,10 +1290,10 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
                 text=causas['Frecuencia'], textposition='outside'
             ))
             fig_pareto.add_trace(go.Scatter(
-                x=causas['Causal'], y=causas['Porcentaje Acum'],
+                x=causas['Causal'], y=causas['Porcentaje_Acum'],
                 name='% Acumulado', line=dict(color=COLOR_PRIMARY, width=3),
                 mode='lines+markers+text',
-                text=[f"{v}%" for v in causas['Porcentaje Acum']],
+                text=[f"{v}%" for v in causas['Porcentaje_Acum']],
                 textposition='top center',
                 yaxis='y2'  # Eje secundario para porcentaje acumulado
             ))
@@ -934,10 +1317,10 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
             st.caption(
                 f"💡 **Insight**: '{top_causa['Causal']}' representa el {top_causa['Porcentaje']}% "
                 f"de los incumplimientos. Enfocar mejoras aquí podría resolver "
-                f"{causas['Porcentaje Acum'].iloc[0]:.0f}% del problema."
+                f"{causas['Porcentaje_Acum'].iloc[0]:.0f}% del problema."
             )
         else:
-            st.success("🎉 Sin incumplimientos para analizar causas en el período seleccionado.")
+            st.success("🎉 Sin causales de incumplimiento registradas en el período seleccionado.")
     else:
         st.info("ℹ️ Columna 'Causal de Incumplimiento' no disponible en los datos.")
 
@@ -945,75 +1328,54 @@ def mostrar_graficos(processor, df_filtrado: pd.DataFrame, debug_mode: bool = Fa
     if 'Categoria' in df_filtrado.columns:
         st.markdown("### 📦 Desempeño por Categoría de Producto")
         
-        # Agrupar datos por categoría con múltiples métricas
+        # Pedidos, % cumplimiento, desvío promedio y valor total por categoría (sin lambdas por grupo)
+        analisis_cat = processor.get_analisis(df_filtrado, ['categoria'])['categoria']
+        analisis_cat = analisis_cat.rename(columns={
+            'Pct_Cumplimiento': '% Cumplimiento', 'Desvio_Prom': 'Desvío Prom', 'Valor_Total': 'Valor Total',
+        })[['Categoria', 'Pedidos', '% Cumplimiento', 'Desvío Prom', 'Valor Total']]
+        analisis_cat = analisis_cat.sort_values('Valor Total', ascending=False)
         
-        
-        # Columna correcta para contar pedidos
-    col_contar = 'No_Orden' if 'No_Orden' in df_filtrado.columns else 'No orden'
-
-    analisis_cat = df_filtrado.groupby('Categoria').agg({
-        col_contar: 'count',  # ← Usar columna válida
-        'Cumple_NNS': lambda x: (x == 'Cumple').sum() / len(x) * 100,
-        'Desvio_Entrega': 'mean'
-    }).round(2).reset_index()
-
-    # Agregar valor total si existe Valor_num
-    if 'Valor_num' in df_filtrado.columns:
-        valor_total = df_filtrado.groupby('Categoria')['Valor_num'].sum().reset_index()
-        valor_total.columns = ['Categoria', 'Valor Total']
-        analisis_cat = analisis_cat.merge(valor_total, on='Categoria', how='left')
-    else:
-        analisis_cat['Valor Total'] = 0
-
-    # Renombrar columnas para claridad
-    analisis_cat.columns = ['Categoria', 'Pedidos', '% Cumplimiento', 'Desvío Prom'] + (['Valor Total'] if 'Valor Total' in analisis_cat.columns else [])
-    analisis_cat = analisis_cat.sort_values('Pedidos', ascending=False)
-
-    # Gráfico de burbujas: X=% cumplimiento, Y=Valor total, tamaño=# pedidos    
-        # Renombrar columnas para claridad
-    col_valor = 'Valor_num' if 'Valor_num' in df_filtrado.columns else 'No orden'
-    analisis_cat.columns = ['Categoria', 'Pedidos', '% Cumplimiento', 'Valor Total', 'Desvío Prom']
-    analisis_cat = analisis_cat.sort_values('Valor Total', ascending=False)
-        
-        # Gráfico de burbujas: X=% cumplimiento, Y=Valor total, tamaño=# pedidos
-    fig_cat = px.scatter(
-            analisis_cat,
-            x='% Cumplimiento', y='Valor Total',
-            size='Pedidos', color='Categoria',
-            hover_data=['Desvío Prom'],
-            text='Categoria',
-            color_discrete_sequence=px.colors.qualitative.Set2,  # Paleta de colores distintivos
-            template=PLOTLY_TEMPLATE
-        )
-    fig_cat.update_traces(textposition='top center', marker=dict(sizemode='diameter'))
-    fig_cat.update_layout(**fig_base(), yaxis_title='Valor Total Despachos (COP)')
-        
-        # Línea de referencia: meta de 80% cumplimiento
-    fig_cat.add_vline(x=80, line_dash='dash', line_color=COLOR_PTE, annotation_text='Meta 80%')
-        
-    st.plotly_chart(fig_cat, use_container_width=True)
-        
-        # Tabla interactiva con formato personalizado
-    st.dataframe(
-            analisis_cat.style.format({
-                'Valor Total': '${:,.0f}',
-                '% Cumplimiento': '{:.1f}%',
-                'Desvío Prom': '{:.1f} días'
-            }), 
-            use_container_width=True
-        )
+        if len(analisis_cat) > 0:
+            # Gráfico de burbujas: X=% cumplimiento, Y=Valor total, tamaño=# pedidos
+            fig_cat = px.scatter(
+                analisis_cat,
+                x='% Cumplimiento', y='Valor Total',
+                size='Pedidos', color='Categoria',
+                hover_data=['Desvío Prom'],
+                text='Categoria',
+                color_discrete_sequence=px.colors.qualitative.Set2,  # Paleta de colores distintivos
+                template=PLOTLY_TEMPLATE
+            )
+            fig_cat.update_traces(textposition='top center', marker=dict(sizemode='diameter'))
+            fig_cat.update_layout(**fig_base(), yaxis_title='Valor Total Despachos (COP)')
+            
+            # Línea de referencia: meta de 80% cumplimiento
+            fig_cat.add_vline(x=80, line_dash='dash', line_color=COLOR_PTE, annotation_text='Meta 80%')
+            
+            st.plotly_chart(fig_cat, use_container_width=True)
+            
+            # Tabla interactiva con formato personalizado
+            st.dataframe(
+                analisis_cat.style.format({
+                    'Valor Total': '${:,.0f}',
+                    '% Cumplimiento': '{:.1f}%',
+                    'Desvío Prom': '{:.1f} días'
+                }), 
+                use_container_width=True
+            )
 
 
 # ──────────────────────────────────────────────────────────────────────────
 # 🚨 SISTEMA DE ALERTAS PROACTIVAS (NUEVA FUNCIONALIDAD)
 # ──────────────────────────────────────────────────────────────────────────
-def generar_alertas(df_filtrado: pd.DataFrame, ind_filtrado: Dict) -> List[Dict]:
+def generar_alertas(df_filtrado: pd.DataFrame, ind_filtrado: Dict, processor) -> List[Dict]:
     """
     Genera alertas automáticas basadas en umbrales configurables de negocio.
     
     Args:
         df_filtrado: DataFrame con datos filtrados para análisis
         ind_filtrado: Diccionario con indicadores calculados
+        processor: Instancia de DataProcessor para el análisis por transportadora
         
     Returns:
         Lista de dicts con estructura: {'tipo', 'titulo', 'mensaje'}
@@ -1046,10 +1408,9 @@ def generar_alertas(df_filtrado: pd.DataFrame, ind_filtrado: Dict) -> List[Dict]
     
     # ⚠️ Alerta 3: Transportadoras con bajo desempeño (si hay datos)
     if 'Transportadora' in df_filtrado.columns and len(df_filtrado) > 0:
-        # Calcular % cumplimiento por transportadora
-        perf_transp = df_filtrado.groupby('Transportadora')['Cumple_NNS'].apply(
-            lambda x: (x == 'Cumple').sum() / len(x) * 100 if len(x) > 0 else 0
-        )
+        # % cumplimiento por transportadora (tabla del análisis agrupado)
+        analisis_t = processor.get_analisis_transportadora(df_filtrado)
+        perf_transp = analisis_t.set_index('Transportadora')['Pct_Cumplimiento']
         # Identificar transportadoras por debajo del umbral mínimo
         malas = perf_transp[perf_transp < UMBRALES_ALERTAS['transportadora_min_perf']]
         if len(malas) > 0:
@@ -1150,13 +1511,18 @@ def mostrar_recomendaciones(processor, df_filtrado: pd.DataFrame) -> None:
 # ──────────────────────────────────────────────────────────────────────────
 # 📋 TABLA DE DETALLE CON SUB-FILTROS Y EXPORTACIÓN
 # ──────────────────────────────────────────────────────────────────────────
-def mostrar_tabla_detalle(processor, df_filtrado: pd.DataFrame) -> None:
+def mostrar_tabla_detalle(
+    processor, 
+    df_filtrado: pd.DataFrame, 
+    clave_seleccion: Optional[tuple] = None
+) -> None:
     """
     Muestra tabla interactiva de incumplimientos con filtros adicionales y exportación.
     
     Args:
         processor: Instancia de DataProcessor
         df_filtrado: DataFrame con datos filtrados globales
+        clave_seleccion: Clave de la selección global, para cachear la exportación
     """
     st.markdown("### 📋 Detalle de Incumplimientos")
 
@@ -1184,13 +1550,17 @@ def mostrar_tabla_detalle(processor, df_filtrado: pd.DataFrame) -> None:
         if 'Desvio_Entrega' in inc.columns and len(inc['Desvio_Entrega'].dropna()) > 0:
             min_d = float(inc['Desvio_Entrega'].min())
             max_d = float(inc['Desvio_Entrega'].max())
-            d_sel = st.slider("⏱️ Desvío mínimo (días)", min_value=min_d, max_value=max_d,
-                              value=min_d, key='tab_desvio')
+            if min_d < max_d:
+                d_sel = st.slider("⏱️ Desvío mínimo (días)", min_value=min_d, max_value=max_d,
+                                  value=min_d, key='tab_desvio')
+            else:
+                # Un solo valor de desvío: el slider no admite mínimo == máximo
+                d_sel = min_d
         else:
             d_sel = 0
 
     # Aplicar sub-filtros a la tabla de incumplimientos
-    df_t = inc.copy()
+    df_t = inc
     if c_sel != 'Todas':
         df_t = df_t[df_t['Ciudad'].astype(str) == c_sel]
     if a_sel != 'Todas' and 'Area_Incumple' in df_t.columns:
@@ -1200,37 +1570,27 @@ def mostrar_tabla_detalle(processor, df_filtrado: pd.DataFrame) -> None:
 
     st.caption(f"Mostrando {len(df_t):,} de {len(inc):,} incumplimientos")
 
-    # ── RENOMBRAR COLUMNAS PARA DISPLAY AMIGABLE ──
-    rename_display = {
-        'Fecha': 'Fecha Compra', 'No_Orden': 'No. Orden',
-        'Cliente': 'Cliente', 'Producto': 'Producto',
-        'Ciudad': 'Ciudad', 'Transportadora': 'Transportadora',
-        'No_Guia': 'No. Guía', 'Fecha_Despacho': 'F. Despacho',
-        'Fecha_Entrega': 'F. Entrega',
-        'Dias_Despacho_Hab': 'Días Despacho', 'Dias_Entrega_Hab': 'Días Entrega',
-        'SLA_Entrega': 'SLA', 'Desvio_Despacho': 'Desvío Despacho',
-        'Desvio_Entrega': 'Desvío Entrega', 'Area_Incumple': 'Área Responsable',
-        'Valor despacho': 'Valor Despacho', 'Causal de Incumplimiento': 'Causal',
-        'Categoria': 'Categoría', 'Concepto': 'Tipo'
-    }
-    df_show = df_t.rename(columns={k: v for k, v in rename_display.items() if k in df_t.columns})
+    # ── RENOMBRAR COLUMNAS PARA DISPLAY AMIGABLE (mismos nombres que las descargas) ──
+    df_show = renombrar_display(df_t)
 
     # Tabla interactiva con scroll horizontal si hay muchas columnas
     st.dataframe(df_show, use_container_width=True, hide_index=True)
 
-    # ── BOTÓN DE EXPORTACIÓN A EXCEL ──
-    col_exp1, col_exp2 = st.columns([1, 4])
+    # ── BOTÓN DE EXPORTACIÓN (Excel / CSV.gz / Parquet, se genera solo al hacer clic) ──
+    col_exp1, col_exp2, _ = st.columns([1, 1, 3])
     with col_exp1:
+        formato = selector_formato('tab_formato')
+    with col_exp2:
         try:
-            buf = io.BytesIO()
-            df_t.to_excel(buf, index=False, sheet_name='Incumplimientos')
-            buf.seek(0)
+            clave = None
+            if clave_seleccion is not None:
+                clave = (clave_seleccion, 'incumplimientos', c_sel, a_sel, float(d_sel), formato)
             st.download_button(
-                "📥 Exportar a Excel",
-                data=buf,
-                file_name="incumplimientos_filtrados.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                help="Descarga los incumplimientos filtrados en formato Excel"
+                "📥 Exportar",
+                data=exportacion_diferida(clave, lambda: exportar_tabla(df_t, formato, 'Incumplimientos')),
+                file_name=f"incumplimientos_filtrados.{formato}",
+                mime=FORMATOS_EXPORTACION[formato]['mime'],
+                help="Descarga los incumplimientos filtrados con los nombres de columna de la tabla"
             )
         except Exception as e:
             logger.error(f"Error exportando tabla: {e}")
@@ -1258,64 +1618,45 @@ def generate_report_advanced(
     Returns:
         BytesIO con archivo Excel en memoria listo para descarga
     """
-    buf = io.BytesIO()
-    
-    with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-        # ── HOJA 1: RESUMEN EJECUTIVO ──
-        resumen = pd.DataFrame({
-            'Métrica': [
-                'Total Pedidos', 'Cumplimiento NNS', 'Desvío Promedio Entrega', 
-                'Valor Total Despachos', 'Transportadoras Activas', 'Ciudades Atendidas'
-            ],
-            'Valor': [
-                ind_filtrado['total_pedidos'],
-                f"{ind_filtrado['pct_cumplimiento']}%",
-                f"{ind_filtrado['promedio_desvio_entrega']} días",
-                f"${df_filtrado.get('Valor_num', pd.Series([0])).sum():,.0f}" if 'Valor_num' in df_filtrado.columns else 'N/A',
-                df_filtrado['Transportadora'].nunique() if 'Transportadora' in df_filtrado.columns else 0,
-                df_filtrado['Ciudad'].nunique() if 'Ciudad' in df_filtrado.columns else 0
-            ],
-            'Variación vs Global': [
-                f"{ind_filtrado['total_pedidos'] - ind_global['total_pedidos']:+d}",
-                f"{ind_filtrado['pct_cumplimiento'] - ind_global['pct_cumplimiento']:+.1f}%",
-                '-', '-', '-', '-'
-            ]
-        })
-        resumen.to_excel(writer, sheet_name='📊 Resumen Ejecutivo', index=False)
-        
-        # ── HOJA 2: DATOS FILTRADOS COMPLETOS ──
-        df_filtrado.to_excel(writer, sheet_name='📋 Datos Filtrados', index=False)
-        
-        # ── HOJA 3: ANÁLISIS POR CATEGORÍA (si aplica) ──
-        if 'Categoria' in df_filtrado.columns:
-            cat_analysis = df_filtrado.groupby('Categoria').agg({
-                'No orden': 'count',
-                'Cumple_NNS': lambda x: (x == 'Cumple').sum() / len(x) * 100,
-                'Valor_num' if 'Valor_num' in df_filtrado.columns else 'No orden': 'sum'
-            }).round(2).reset_index()
-            cat_analysis.columns = ['Categoria', 'Pedidos', '% Cumplimiento', 'Valor Total']
-            cat_analysis.to_excel(writer, sheet_name='📦 Por Categoría', index=False)
-        
-        # ── HOJA 4: CAUSALES DE INCUMPLIMIENTO (si aplica) ──
-        if 'Causal de Incumplimiento' in df_filtrado.columns:
-            df_inc = df_filtrado[df_filtrado['Cumple_NNS'] == 'No cumple']
-            if len(df_inc) > 0:
-                causal_analysis = df_inc['Causal de Incumplimiento'].value_counts().reset_index()
-                causal_analysis.columns = ['Causal', 'Frecuencia']
-                causal_analysis.to_excel(writer, sheet_name='🎯 Causales', index=False)
-        
-        # ── APLICAR FORMATO PROFESIONAL A LAS HOJAS ──
-        workbook = writer.book
-        for sheet_name in workbook.sheetnames:
-            worksheet = workbook[sheet_name]
-            # Estilo para fila de encabezado: fondo índigo, texto blanco, negrita, centrado
-            for cell in worksheet[1]:
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
+    # ── HOJA 1: RESUMEN EJECUTIVO ──
+    resumen = pd.DataFrame({
+        'Métrica': [
+            'Total Pedidos', 'Cumplimiento NNS', 'Desvío Promedio Entrega', 
+            'Valor Total Despachos', 'Transportadoras Activas', 'Ciudades Atendidas'
+        ],
+        'Valor': [
+            ind_filtrado['total_pedidos'],
+            f"{ind_filtrado['pct_cumplimiento']}%",
+            f"{ind_filtrado['promedio_desvio_entrega']} días",
+            f"${df_filtrado.get('Valor_num', pd.Series([0])).sum():,.0f}" if 'Valor_num' in df_filtrado.columns else 'N/A',
+            df_filtrado['Transportadora'].nunique() if 'Transportadora' in df_filtrado.columns else 0,
+            df_filtrado['Ciudad'].nunique() if 'Ciudad' in df_filtrado.columns else 0
+        ],
+        'Variación vs Global': [
+            f"{ind_filtrado['total_pedidos'] - ind_global['total_pedidos']:+d}",
+            f"{ind_filtrado['pct_cumplimiento'] - ind_global['pct_cumplimiento']:+.1f}%",
+            '-', '-', '-', '-'
+        ]
+    })
+    
+    # ── HOJA 2: DATOS FILTRADOS COMPLETOS ──
+    hojas = {'📊 Resumen Ejecutivo': resumen, '📋 Datos Filtrados': df_filtrado}
+    
+    # ── HOJAS 3 Y 4: CATEGORÍA Y CAUSALES (análisis agrupado en una sola pasada) ──
+    analisis = processor.get_analisis(df_filtrado, ['categoria', 'causal'])
+    
+    cat_analysis = analisis['categoria']
+    if len(cat_analysis) > 0:
+        cat_analysis = cat_analysis[['Categoria', 'Pedidos', 'Pct_Cumplimiento', 'Valor_Total']]
+        cat_analysis.columns = ['Categoria', 'Pedidos', '% Cumplimiento', 'Valor Total']
+        hojas['📦 Por Categoría'] = cat_analysis
     
-    buf.seek(0)  # Reiniciar buffer para lectura
-    return buf
+    causal_analysis = analisis['causal']
+    if len(causal_analysis) > 0:
+        hojas['🎯 Causales'] = causal_analysis[['Causal', 'Frecuencia']]
+    
+    # Escritura en streaming (memoria acotada) con encabezado índigo, texto blanco, negrita, centrado
+    return exportar_excel(hojas, estilo_encabezado=ESTILO_ENCABEZADO)
 
 
 # ──────────────────────────────────────────────────────────────────────────
@@ -1326,16 +1667,18 @@ def main():
     Función principal que orquesta todo el flujo de la aplicación Streamlit.
     Sigue el patrón: Carga → Procesamiento → Filtrado → Visualización → Exportación
     """
-    # ── SIDEBAR: CARGA DE ARCHIVO EXCEL ──
+    # ── SIDEBAR: CARGA DE ARCHIVO EXCEL / CSV ──
     st.sidebar.markdown("### 📂 Cargar Archivo")
-    uploaded = st.sidebar.file_uploader(
-        "Archivo Excel (.xlsx / .xls)",
-        type=['xlsx', 'xls'],
-        help="Sube el archivo de Seguimiento de Despachos TECU con las columnas esperadas"
+    subidos = st.sidebar.file_uploader(
+        "Archivos Excel o CSV (.xlsx / .xls / .csv)",
+        type=['xlsx', 'xls', 'csv'],
+        accept_multiple_files=True,
+        help="Sube uno o varios archivos de Seguimiento de Despachos TECU con las columnas esperadas. "
+             "Con varios, un pedido repetido se toma del último archivo cargado."
     )
 
     # ── PANTALLA DE BIENVENIDA (si no hay archivo cargado) ──
-    if uploaded is None:
+    if not subidos:
         st.markdown("# 📦 TECU – Análisis de Despachos")
         st.markdown("---")
 
@@ -1356,25 +1699,27 @@ def main():
                     "- **NUEVO**: Categoría, Concepto, Rango de Valor\n"
                     "- Drill-down interactivo en gráficos")
 
-        st.markdown("\n#### 👆 Sube el archivo Excel en el panel izquierdo para comenzar.")
+        st.markdown("\n#### 👆 Sube uno o varios archivos Excel o CSV en el panel izquierdo para comenzar.")
         st.markdown(
             "> 💡 **Tip**: Los datos se procesan localmente en tu navegador. "
             "Ninguna información sale de tu computadora."
         )
         return
 
+    uploaded = preparar_carga(subidos)
+
     # ── SIDEBAR: CONFIGURACIÓN DE PARÁMETROS SLA ──
     st.sidebar.markdown("### ⚙️ Configuración SLA")
     sl_alm = st.sidebar.slider(
-        "Límite Almacén (días)", 1, 5, 1, 
+        "Límite Almacén (días)", RANGO_SLA_ALMACEN[0], RANGO_SLA_ALMACEN[-1], 1, 
         help="Días hábiles máximos permitidos para despacho desde almacén"
     )
     sl_pri = st.sidebar.slider(
-        "SLA Ciudades Principales (días)", 1, 3, 3, 
+        "SLA Ciudades Principales (días)", RANGO_SLA_PRINCIPAL[0], RANGO_SLA_PRINCIPAL[-1], 3, 
         help="Tiempo máximo de entrega para Bogotá, Medellín, Cali"
     )
     sl_otr = st.sidebar.slider(
-        "SLA Otras Ciudades (días)", 3, 5, 5,
+        "SLA Otras Ciudades (días)", RANGO_SLA_OTRAS[0], RANGO_SLA_OTRAS[-1], 5,
         help="Tiempo máximo de entrega para el resto de destinos"
     )
     st.sidebar.markdown("---")
@@ -1391,15 +1736,35 @@ def main():
         return
 
     # ── APLICAR FILTROS GLOBALES DEL SIDEBAR ──
-    df_filtrado, debug_mode = sidebar_filtros(df_procesado)
+    digest = huella_archivo(uploaded)
+    clave_dataset = (digest, (sl_alm, sl_pri, sl_otr))
+    indice = _etapa_indice_filtros(digest, uploaded.name, uploaded)
+    df_filtrado, debug_mode, clave_seleccion = sidebar_filtros(df_procesado, indice, clave_dataset)
+    
+    # 🧊 Cubo de agregados: los filtros del sidebar son dimensiones del cubo, salvo el rango
+    # de valor (por fila); con rango activo los KPIs de la selección se calculan sobre filas
+    cubo = _etapa_cubo(digest, uploaded.name, uploaded, (sl_alm, sl_pri, sl_otr))
+    seleccion = dict(clave_seleccion[1])
+    cubo_filtrado = None
+    if cubo is not None and COLUMNA_VALOR not in seleccion:
+        cubo_filtrado = cubo.filtrar(seleccion)
+    
+    # ♻️ Indicadores y análisis del dataset completo y de la selección, servidos desde la caché LRU
+    processor = ProcesadorMemoizado(processor, _cache_selecciones(), [
+        (df_procesado, (clave_dataset, ()), cubo),
+        (df_filtrado, clave_seleccion, cubo_filtrado),
+    ])
     logger.info(f"Filtros aplicados: {len(df_filtrado)} registros de {len(df_procesado)} totales")
 
+    # ── CÁLCULO DE INDICADORES (GLOBAL Y FILTRADO): una sola vez por rerun ──
+    ind_global = processor.get_indicadores(df_procesado)
+    indicadores = processor.get_indicadores(df_filtrado)
+
     # ── BOTÓN DE EXPORTACIÓN AVANZADA (MEGA REPORTE) ──
     st.sidebar.markdown("---")
     st.sidebar.markdown("### 📊 Reportes")
     try:
-        ind_global = processor.get_indicadores(df_procesado)
-        ind_filtrado = processor.get_indicadores(df_filtrado)
+        ind_filtrado = indicadores
         
         if ind_filtrado:
             # Texto dinámico del botón según si hay filtros activos
@@ -1407,14 +1772,32 @@ def main():
             if len(df_filtrado) < len(df_procesado):
                 btn_label = "📥 Descargar Reporte Filtrado"
                 
-            # Generar archivo Excel con múltiples hojas de análisis
-            mega_buf = generate_report_advanced(df_filtrado, ind_filtrado, ind_global, processor)
+            formato = selector_formato('formato_reporte', st.sidebar)
+            marca = datetime.now().strftime('%Y%m%d_%H%M')
+            # Los archivos se generan solo al hacer clic y se reutilizan mientras
+            # no cambien el dataset, el SLA ni los filtros
+            if formato == 'xlsx':
+                # Excel con múltiples hojas de análisis
+                archivo = exportacion_diferida(
+                    (clave_seleccion, 'reporte_avanzado'),
+                    lambda: generate_report_advanced(df_filtrado, ind_filtrado, ind_global, processor)
+                )
+                nombre = f"Reporte_TECU_Analisis_{marca}.xlsx"
+                ayuda = "Excel con: Resumen Ejecutivo, Datos Filtrados, Análisis por Categoría y Causales"
+            else:
+                # Formatos para BI: solo los datos filtrados, por bloques
+                archivo = exportacion_diferida(
+                    (clave_seleccion, 'datos_filtrados', formato),
+                    lambda: exportar_tabla(df_filtrado, formato)
+                )
+                nombre = f"Datos_TECU_Filtrados_{marca}.{formato}"
+                ayuda = "Datos filtrados completos, con los nombres de columna de la tabla de detalle"
             st.sidebar.download_button(
                 btn_label,
-                data=mega_buf,
-                file_name=f"Reporte_TECU_Analisis_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                help="Excel con: Resumen Ejecutivo, Datos Filtrados, Análisis por Categoría y Causales"
+                data=archivo,
+                file_name=nombre,
+                mime=FORMATOS_EXPORTACION[formato]['mime'],
+                help=ayuda
             )
     except Exception as e:
         logger.error(f"Error generando reporte avanzado: {e}", exc_info=True)
@@ -1433,12 +1816,23 @@ def main():
         f"**Hoja:** `{hoja}` &nbsp;|&nbsp; "
         f"**Registros seleccionados:** {len(df_filtrado):,} / {len(df_procesado):,}"
     )
+    if isinstance(uploaded, CargaMultiple):
+        _, _, resumen = _etapa_consolidacion(digest, uploaded.name, uploaded)
+        st.caption(
+            f"🔗 {resumen['archivos']} archivos consolidados: {resumen['filas_leidas']:,} filas leídas · "
+            f"{resumen['pedidos_repetidos']:,} pedidos repetidos ({resumen['filas_reemplazadas']:,} filas "
+            f"reemplazadas por el último archivo cargado)"
+        )
+    else:
+        version = st.session_state.get('versiones_libros', {}).get(uploaded.name)
+        cambios = version['cambios'] if version is not None and version['digest'] == digest else None
+        if cambios is not None:
+            st.caption(
+                f"🆕 {cambios['nuevas']:,} filas nuevas · ✏️ {cambios['modificadas']:,} modificadas · "
+                f"{cambios['sin_cambios']:,} sin cambios respecto a la versión cargada antes"
+            )
     st.markdown("---")
 
-    # ── CÁLCULO DE INDICADORES (GLOBAL Y FILTRADO) ──
-    ind_global = processor.get_indicadores(df_procesado)
-    indicadores = processor.get_indicadores(df_filtrado)
-
     # Validar que hay datos para mostrar
     if indicadores is None or indicadores['total_pedidos'] == 0:
         st.warning("⚠️ No hay pedidos con status 'Entregado' en el rango seleccionado.")
@@ -1450,15 +1844,19 @@ def main():
     etiqueta = "Total General con filtros" if es_global else "Selección Actual"
     
     mostrar_kpis(ind_global, indicadores, etiqueta)
+    
+    # ── SENSIBILIDAD SLA: todas las combinaciones sin reprocesar ──
+    matriz = _etapa_matriz_sla(digest, uploaded.name, uploaded)
+    mostrar_sensibilidad_sla(matriz, df_filtrado, (sl_alm, sl_pri, sl_otr))
     st.markdown("---")
 
     # ── RENDERIZAR GRÁFICOS INTERACTIVOS ──
-    mostrar_graficos(processor, df_filtrado, debug_mode)
+    mostrar_graficos(processor, df_filtrado, debug_mode, clave_seleccion)
     st.markdown("---")
 
     # ── RENDERIZAR SISTEMA DE ALERTAS PROACTIVAS (NUEVO) ──
     st.markdown("### 🚨 Alertas Automáticas")
-    alertas = generar_alertas(df_filtrado, indicadores)
+    alertas = generar_alertas(df_filtrado, indicadores, processor)
     mostrar_alertas(alertas)
     st.markdown("---")
 
@@ -1467,7 +1865,7 @@ def main():
     st.markdown("---")
 
     # ── RENDERIZAR TABLA DE DETALLE CON SUB-FILTROS ──
-    mostrar_tabla_detalle(processor, df_filtrado)
+    mostrar_tabla_detalle(processor, df_filtrado, clave_seleccion)
 
 
 # ──────────────────────────────────────────────────────────────────────────
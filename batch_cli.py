@@ -0,0 +1,323 @@
+"""
+PROCESAMIENTO POR LOTES (CLI) - TECU Aura
+Procesa muchos libros "Seguimiento gestion despachos" (uno por cliente y
+periodo, en Excel o exportados a CSV) sin Streamlit y escribe tablas consolidadas de KPIs y análisis.
+
+Cada libro se procesa en un proceso del pool (lectura + limpieza + SLA); un
+libro que falla queda registrado con su error sin detener el lote. Los
+procesos devuelven solo el cubo de cumplimiento y las causales del libro,
+que se combinan en el proceso principal: el DataFrame completo no viaja
+entre procesos.
+
+La limpieza reutiliza la caché en disco de la app (cache_store), de modo que
+los libros sin cambios desde la corrida anterior no se vuelven a limpiar.
+Con --filas-bloque, los CSV (historias de varios años) se recorren por
+bloques con memoria acotada (DataProcessor.procesar_en_bloques), sin caché.
+
+Salida (en --salida):
+- xlsx: reporte_lote.xlsx con una hoja por tabla
+- csv.gz / parquet: un archivo por tabla (resumen, kpis_por_archivo,
+  ciudad, transportadora, mes, categoria, causal)
+
+Uso:
+    python batch_cli.py reportes/
+    python batch_cli.py "clientes/**/Seguimiento*.xlsx" --formato parquet --procesos 8
+    python batch_cli.py a.xlsx b.xlsx --sla-principal 2 --sla-otras 4 --salida nocturno
+    python batch_cli.py historico_2020_2026.csv --filas-bloque 200000
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import glob
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+
+import cache_store
+from data_processor import CuboCumplimiento, DataProcessor
+from exportador import (
+    ESTILO_ENCABEZADO, exportar_csv_gzip, exportar_excel, exportar_parquet, formatos_disponibles,
+)
+from readers import HOJA_CSV, cargar_libro, extensiones_soportadas, leer_csv_por_bloques
+
+logger = logging.getLogger(__name__)
+
+# Tablas consolidadas: nombre de archivo → nombre de hoja (xlsx)
+TABLAS_LOTE = {
+    'resumen': 'Resumen Lote',
+    'kpis_por_archivo': 'KPIs por Archivo',
+    'ciudad': 'Por Ciudad',
+    'transportadora': 'Por Transportadora',
+    'mes': 'Por Mes',
+    'categoria': 'Por Categoría',
+    'causal': 'Causales',
+}
+AGRUPACIONES_CUBO = ['ciudad', 'transportadora', 'mes', 'categoria']
+
+
+# ──────────────────────────────────────────────────────────────────────────
+# 🔎 DESCUBRIMIENTO DE ARCHIVOS
+# ──────────────────────────────────────────────────────────────────────────
+def descubrir_archivos(entradas: list) -> list:
+    """
+    Resuelve directorios, globs y rutas a la lista de libros a procesar.
+
+    Los directorios aportan sus libros directos (sin recursión; usar un glob
+    con ** para subcarpetas). Se omiten los temporales de Excel (~$...) y
+    las extensiones que ningún motor instalado puede leer.
+    """
+    extensiones = set(extensiones_soportadas())
+    encontrados = {}
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = [os.path.join(entrada, n) for n in os.listdir(entrada)]
+        elif os.path.isfile(entrada):
+            candidatos = [entrada]
+        else:
+            candidatos = glob.glob(entrada, recursive=True)
+            if not candidatos:
+                logger.warning(f"Sin coincidencias para '{entrada}'")
+        for ruta in candidatos:
+            nombre = os.path.basename(ruta)
+            if (os.path.isfile(ruta) and not nombre.startswith('~$')
+                    and os.path.splitext(nombre)[1].lower() in extensiones):
+                encontrados.setdefault(os.path.abspath(ruta), ruta)
+    return sorted(encontrados.values())
+
+
+# ──────────────────────────────────────────────────────────────────────────
+# ⚙️ PROCESAMIENTO DE UN LIBRO (se ejecuta en un proceso del pool)
+# ──────────────────────────────────────────────────────────────────────────
+def _limpiar(contenido: bytes, nombre: str, usar_cache: bool) -> tuple:
+    """Lectura + limpieza con la caché en disco de la app. Retorna (DataFrame limpio, hoja)."""
+    clave = cache_store.clave_cache(cache_store.digest_bytes(contenido))
+    if usar_cache:
+        en_disco = cache_store.leer(clave)
+        if en_disco is not None:
+            df_limpio, meta = en_disco
+            return df_limpio, meta.get('hoja')
+
+    df, hoja = cargar_libro(contenido, nombre)
+    df_limpio = DataProcessor(df).limpiar()
+    if usar_cache:
+        cache_store.guardar(clave, df_limpio, {'hoja': hoja, 'archivo': nombre})
+    return df_limpio, hoja
+
+
+def procesar_archivo(ruta: str, sla: tuple = (1, 3, 5), usar_cache: bool = True,
+                     filas_bloque: int = None) -> dict:
+    """
+    Procesa un libro completo. Nunca lanza excepciones: los errores se
+    devuelven en el resultado para aislar cada archivo del resto del lote.
+    Con `filas_bloque`, los CSV se procesan por bloques de ese tamaño.
+
+    Returns:
+        Dict con archivo, ok, segundos y, si ok, hoja, registros,
+        indicadores, cubo y causales; si falla, error
+    """
+    inicio = time.perf_counter()
+    resultado = {'archivo': ruta, 'ok': False}
+    try:
+        if filas_bloque and ruta.lower().endswith('.csv'):
+            datos = DataProcessor.procesar_en_bloques(leer_csv_por_bloques(ruta, filas_bloque), *sla)
+            hoja = HOJA_CSV
+            cubo = datos.cubo if datos.cubo is not None else CuboCumplimiento.combinar([])
+        else:
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+            df_limpio, hoja = _limpiar(contenido, os.path.basename(ruta), usar_cache)
+            datos = DataProcessor.aplicar_sla(df_limpio, *sla)
+            cubo = DataProcessor.construir_cubo(datos)
+        causales = DataProcessor.get_analisis(datos, ['causal'])['causal']
+        resultado.update({
+            'ok': True,
+            'hoja': hoja,
+            'registros': len(datos),
+            'indicadores': cubo.indicadores(),
+            'cubo': cubo,
+            'causales': causales[['Causal', 'Frecuencia']] if len(causales) else None,
+        })
+    except Exception as e:
+        logger.debug(f"Error procesando {ruta}", exc_info=True)
+        resultado['error'] = f"{type(e).__name__}: {e}"
+    resultado['segundos'] = round(time.perf_counter() - inicio, 2)
+    return resultado
+
+
+def procesar_lote(archivos: list, sla: tuple, procesos: int, usar_cache: bool = True, progreso=None,
+                  filas_bloque: int = None) -> list:
+    """
+    Procesa los libros en un pool de procesos (uno por libro a la vez).
+
+    Args:
+        archivos: Rutas de los libros
+        sla: (sla_almacen, sla_principal, sla_otras)
+        procesos: Máximo de procesos; 1 = en el proceso actual
+        usar_cache: Reutilizar la caché en disco de la limpieza
+        progreso: Callback opcional progreso(hechos, total, resultado)
+        filas_bloque: Procesar los CSV por bloques de este tamaño (memoria acotada)
+
+    Returns:
+        Resultados de procesar_archivo, en el orden de `archivos`
+    """
+    resultados = {}
+
+    def registrar(ruta, resultado):
+        resultados[ruta] = resultado
+        if progreso is not None:
+            progreso(len(resultados), len(archivos), resultado)
+
+    procesos = max(1, min(procesos, len(archivos)))
+    if procesos == 1:
+        for ruta in archivos:
+            registrar(ruta, procesar_archivo(ruta, sla, usar_cache, filas_bloque))
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = {pool.submit(procesar_archivo, ruta, sla, usar_cache, filas_bloque): ruta for ruta in archivos}
+            for futuro in as_completed(futuros):
+                ruta = futuros[futuro]
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    # El proceso murió (memoria, señal) o el resultado no se pudo transferir
+                    resultado = {'archivo': ruta, 'ok': False, 'segundos': None,
+                                 'error': f"{type(e).__name__}: {e}"}
+                registrar(ruta, resultado)
+    return [resultados[ruta] for ruta in archivos]
+
+
+# ──────────────────────────────────────────────────────────────────────────
+# 📊 CONSOLIDACIÓN
+# ──────────────────────────────────────────────────────────────────────────
+def tabla_kpis_por_archivo(resultados: list) -> pd.DataFrame:
+    """Una fila por libro: estado, registros, KPIs, duración y error."""
+    filas = []
+    for r in resultados:
+        fila = {
+            'Archivo': os.path.basename(r['archivo']),
+            'Ruta': r['archivo'],
+            'Estado': 'OK' if r['ok'] else 'Error',
+            'Hoja': r.get('hoja'),
+            'Registros': r.get('registros', 0),
+        }
+        fila.update(r.get('indicadores') or {})
+        fila['Segundos'] = r.get('segundos')
+        fila['Error'] = r.get('error', '')
+        filas.append(fila)
+    return pd.DataFrame(filas)
+
+
+def consolidar_causales(tablas: list) -> pd.DataFrame:
+    """Suma la frecuencia de cada causal entre libros y recalcula los porcentajes."""
+    tablas = [t for t in tablas if t is not None and len(t)]
+    if not tablas:
+        return pd.DataFrame(columns=['Causal', 'Frecuencia', 'Porcentaje', 'Porcentaje_Acum'])
+    causal = pd.concat(tablas, ignore_index=True).groupby('Causal', sort=False)['Frecuencia'].sum()
+    causal = causal.sort_values(ascending=False, kind='stable').reset_index()
+    causal['Porcentaje'] = (causal['Frecuencia'] / causal['Frecuencia'].sum() * 100).round(1)
+    causal['Porcentaje_Acum'] = causal['Porcentaje'].cumsum()
+    return causal
+
+
+def consolidar(resultados: list) -> dict:
+    """
+    Tablas del lote: resumen de KPIs global, KPIs por archivo y análisis por
+    ciudad, transportadora, mes, categoría y causal sobre todos los libros.
+    """
+    correctos = [r for r in resultados if r['ok']]
+    cubo = CuboCumplimiento.combinar([r['cubo'] for r in correctos])
+    indicadores = cubo.indicadores()
+
+    resumen = pd.DataFrame({
+        'Métrica': ['Archivos procesados', 'Archivos con error'] + list(indicadores),
+        'Valor': [len(correctos), len(resultados) - len(correctos)] + list(indicadores.values()),
+    })
+    tablas = {'resumen': resumen, 'kpis_por_archivo': tabla_kpis_por_archivo(resultados)}
+    if correctos:
+        tablas.update(DataProcessor.get_analisis(cubo, AGRUPACIONES_CUBO))
+    else:
+        tablas.update({nombre: pd.DataFrame() for nombre in AGRUPACIONES_CUBO})
+    tablas['causal'] = consolidar_causales([r['causales'] for r in correctos])
+    return tablas
+
+
+def escribir_tablas(tablas: dict, salida: str, formato: str) -> list:
+    """Escribe las tablas en `salida` en el formato pedido. Retorna las rutas creadas."""
+    os.makedirs(salida, exist_ok=True)
+    if formato == 'xlsx':
+        ruta = os.path.join(salida, 'reporte_lote.xlsx')
+        hojas = {TABLAS_LOTE[nombre]: tablas[nombre] for nombre in TABLAS_LOTE}
+        exportar_excel(hojas, estilo_encabezado=ESTILO_ENCABEZADO, destino=ruta)
+        return [ruta]
+
+    exportar = exportar_csv_gzip if formato == 'csv.gz' else exportar_parquet
+    rutas = []
+    for nombre in TABLAS_LOTE:
+        ruta = os.path.join(salida, f"{nombre}.{formato}")
+        exportar(tablas[nombre], destino=ruta)
+        rutas.append(ruta)
+    return rutas
+
+
+# ──────────────────────────────────────────────────────────────────────────
+# 🖥️ LÍNEA DE COMANDOS
+# ──────────────────────────────────────────────────────────────────────────
+def _imprimir_progreso(hechos: int, total: int, resultado: dict) -> None:
+    nombre = os.path.basename(resultado['archivo'])
+    if resultado['ok']:
+        detalle = (f"✓ {resultado['registros']:,} registros · "
+                   f"{resultado['indicadores']['pct_cumplimiento']}% NNS ({resultado['segundos']} s)")
+    else:
+        detalle = f"✗ {resultado['error']}"
+    print(f"[{hechos}/{total}] {nombre}: {detalle}", file=sys.stderr, flush=True)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Procesa en paralelo libros de seguimiento de despachos y consolida KPIs'
+    )
+    parser.add_argument('entradas', nargs='+', help='Directorios, globs o rutas de libros')
+    parser.add_argument('--salida', default='reporte_lote', help='Directorio de salida')
+    parser.add_argument('--formato', choices=formatos_disponibles(), default='xlsx')
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                        help='Procesos en paralelo (por defecto, todos los núcleos)')
+    parser.add_argument('--sla-almacen', type=int, default=1, help='Días máximos de despacho desde almacén')
+    parser.add_argument('--sla-principal', type=int, default=3, help='SLA de entrega en ciudades principales')
+    parser.add_argument('--sla-otras', type=int, default=5, help='SLA de entrega en otras ciudades')
+    parser.add_argument('--sin-cache', action='store_true', help='No leer ni escribir la caché en disco')
+    parser.add_argument('--filas-bloque', type=int, default=None,
+                        help='Procesar los CSV por bloques de N filas (historias grandes, memoria acotada)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Logs detallados')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s',
+    )
+
+    archivos = descubrir_archivos(args.entradas)
+    if not archivos:
+        print("No se encontraron libros para procesar", file=sys.stderr)
+        return 2
+
+    sla = (args.sla_almacen, args.sla_principal, args.sla_otras)
+    print(f"Procesando {len(archivos)} libros con {min(args.procesos, len(archivos))} procesos "
+          f"(SLA {sla[0]}/{sla[1]}/{sla[2]} días)", file=sys.stderr)
+    inicio = time.perf_counter()
+    resultados = procesar_lote(
+        archivos, sla, args.procesos, not args.sin_cache, _imprimir_progreso, args.filas_bloque
+    )
+
+    rutas = escribir_tablas(consolidar(resultados), args.salida, args.formato)
+    errores = sum(not r['ok'] for r in resultados)
+    print(f"Listo en {time.perf_counter() - inicio:.1f} s: {len(resultados) - errores} correctos, "
+          f"{errores} con error → {', '.join(rutas)}", file=sys.stderr)
+    # Código 1 si algún libro falló (útil en tareas programadas)
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
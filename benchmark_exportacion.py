@@ -0,0 +1,117 @@
+"""
+BENCHMARK DE EXPORTACIÓN EXCEL - TECU Aura
+Compara tiempo y pico de memoria del reporte avanzado escrito con
+pd.ExcelWriter(engine='openpyxl') (ruta anterior) contra la escritura en
+streaming de exportador.py (xlsxwriter, constant_memory).
+
+El dataset se arma replicando las filas procesadas de un libro de ejemplo
+hasta el tamaño pedido. El pico de memoria se mide con tracemalloc en una
+segunda corrida, para que el rastreo no infle el tiempo.
+
+Uso:
+    python benchmark_exportacion.py --filas 500000
+    python benchmark_exportacion.py "Seguimiento gestion despachos TECU Aura.xlsx" --filas 100000
+"""
+
+import argparse
+import gc
+import io
+import logging
+import time
+import tracemalloc
+
+import pandas as pd
+from openpyxl.styles import Alignment, Font, PatternFill
+
+from data_processor import DataProcessor
+from exportador import ESTILO_ENCABEZADO, exportar_excel
+from readers import leer_archivo
+
+ARCHIVO_EJEMPLO = 'Seguimiento gestion despachos TECU Aura.xlsx'
+
+
+def armar_dataset(ruta: str, filas: int) -> tuple:
+    """Procesa el libro y replica sus filas hasta `filas` registros."""
+    df, _ = leer_archivo(ruta)
+    processor = DataProcessor(df)
+    base = processor.procesar()
+    veces = filas // len(base) + 1
+    grande = pd.concat([base] * veces, ignore_index=True).iloc[:filas]
+    return processor, grande
+
+
+def hojas_reporte(processor, df: pd.DataFrame) -> dict:
+    """Mismas hojas que generate_report_advanced (resumen abreviado)."""
+    ind = processor.get_indicadores(df)
+    analisis = processor.get_analisis(df, ['categoria', 'causal'])
+    hojas = {
+        '📊 Resumen Ejecutivo': pd.DataFrame({
+            'Métrica': ['Total Pedidos', 'Cumplimiento NNS'],
+            'Valor': [ind['total_pedidos'], f"{ind['pct_cumplimiento']}%"],
+        }),
+        '📋 Datos Filtrados': df,
+    }
+    if len(analisis['categoria']) > 0:
+        hojas['📦 Por Categoría'] = analisis['categoria']
+    if len(analisis['causal']) > 0:
+        hojas['🎯 Causales'] = analisis['causal'][['Causal', 'Frecuencia']]
+    return hojas
+
+
+def exportar_openpyxl(hojas: dict) -> io.BytesIO:
+    """Ruta anterior: libro completo en memoria con openpyxl y estilo de encabezado."""
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine='openpyxl') as writer:
+        for nombre, df in hojas.items():
+            df.to_excel(writer, sheet_name=nombre, index=False)
+        for worksheet in writer.book.worksheets:
+            for cell in worksheet[1]:
+                cell.font = Font(bold=True, color="FFFFFF")
+                cell.fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
+                cell.alignment = Alignment(horizontal="center")
+    buf.seek(0)
+    return buf
+
+
+def exportar_streaming(hojas: dict) -> io.BytesIO:
+    return exportar_excel(hojas, estilo_encabezado=ESTILO_ENCABEZADO)
+
+
+MOTORES = {'openpyxl': exportar_openpyxl, 'streaming': exportar_streaming}
+
+
+def medir(exportar, hojas: dict) -> dict:
+    """Tiempo (s), pico de memoria asignada (MB) y tamaño del archivo (MB)."""
+    gc.collect()
+    inicio = time.perf_counter()
+    tamano = len(exportar(hojas).getvalue())
+    segundos = time.perf_counter() - inicio
+
+    gc.collect()
+    tracemalloc.start()
+    exportar(hojas)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'segundos': round(segundos, 2), 'pico_mb': round(pico / 1e6, 1), 'archivo_mb': round(tamano / 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de memoria de la exportación Excel')
+    parser.add_argument('archivo', nargs='?', default=ARCHIVO_EJEMPLO, help='Libro de ejemplo a replicar')
+    parser.add_argument('--filas', type=int, default=100_000, help='Filas del dataset exportado')
+    parser.add_argument('--motores', nargs='+', choices=sorted(MOTORES), default=sorted(MOTORES))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    processor, df = armar_dataset(args.archivo, args.filas)
+    hojas = hojas_reporte(processor, df)
+    print(f"Dataset: {len(df):,} filas × {df.shape[1]} columnas "
+          f"({df.memory_usage(deep=True).sum() / 1e6:.1f} MB en memoria)")
+
+    for motor in args.motores:
+        r = medir(MOTORES[motor], hojas)
+        print(f"{motor:>10}: {r['segundos']:>7.2f} s | pico {r['pico_mb']:>8.1f} MB | archivo {r['archivo_mb']:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+BENCHMARK DE MEMORIA POR RERUN - TECU Aura
+Mide la memoria que asigna cada rerun de Streamlit (click en un gráfico,
+cambio de pestaña) en la ruta de datos: obtener el DataFrame procesado,
+crear el DataProcessor, aplicar los filtros del sidebar y armar las tablas
+de drill-down e incumplimientos.
+
+Compara dos rutas sobre el mismo dataset:
+- copias: la ruta anterior. El DataFrame sale de st.cache_data (se
+  deserializa una copia por rerun), DataProcessor lo copia, el filtro se
+  materializa de nuevo y las tablas derivadas hacen .copy().
+- compartido: la ruta actual. El DataFrame procesado y el filtrado salen de
+  cachés compartidas (solo lectura) y las vistas derivadas no copian. Se mide
+  en frío (caché de selecciones vacía en cada rerun: filtro y tablas se
+  recalculan, como en copias) y en caliente (misma selección ya en caché).
+  La diferencia copias → frío es lo que ahorra no copiar; frío → caliente, la caché.
+
+El dataset se arma replicando las filas procesadas de un libro de ejemplo.
+La memoria se mide con tracemalloc (pico asignado durante el rerun).
+
+Uso:
+    python benchmark_memoria.py --filas 500000
+    python benchmark_memoria.py "Seguimiento gestion despachos TECU Aura.xlsx" --filas 100000 --reruns 5
+"""
+
+import argparse
+import gc
+import logging
+import pickle
+import time
+import tracemalloc
+
+import pandas as pd
+
+from cache_memoria import CacheLRU
+from data_processor import DataProcessor
+from filtros import IndiceFiltros
+from readers import leer_archivo
+
+ARCHIVO_EJEMPLO = 'Seguimiento gestion despachos TECU Aura.xlsx'
+
+
+def armar_dataset(ruta: str, filas: int) -> pd.DataFrame:
+    """Procesa el libro y replica sus filas hasta `filas` registros (esquema compacto)."""
+    df, _ = leer_archivo(ruta)
+    base = DataProcessor(df).procesar()
+    veces = filas // len(base) + 1
+    grande = pd.concat([base] * veces, ignore_index=True).iloc[:filas]
+    return DataProcessor.aplicar_esquema(grande)
+
+
+def seleccion_ejemplo(df: pd.DataFrame) -> dict:
+    """Filtro típico del sidebar: la transportadora con más pedidos."""
+    if 'Transportadora' not in df.columns:
+        return {}
+    return {'Transportadora': [str(df['Transportadora'].value_counts().idxmax())]}
+
+
+def rerun_copias(serializado: bytes, indice: IndiceFiltros, selecciones: dict) -> int:
+    """Ruta anterior: copia deserializada, copia en DataProcessor y .copy() en las vistas."""
+    df = pickle.loads(serializado)                     # st.cache_data: copia por rerun
+    processor = DataProcessor(df.copy())               # DataProcessor copiaba su entrada
+    df_f = df.take(indice.filas(selecciones))          # filtro materializado en cada rerun
+    df_fuente = df_f.copy()                            # mostrar_datos_fuente
+    inc = processor.get_pedidos_incumplimiento(df_f).copy()
+    df_t = inc.copy()                                  # mostrar_tabla_detalle
+    return len(df_fuente) + len(df_t)
+
+
+def rerun_compartido(df: pd.DataFrame, indice: IndiceFiltros, selecciones: dict, cache: CacheLRU) -> int:
+    """Ruta actual: DataFrames compartidos (solo lectura) y vistas sin copia."""
+    processor = DataProcessor(df)
+    clave = indice.clave(selecciones)
+    filas = cache.obtener((clave, 'filas'), lambda: indice.filas(selecciones))
+    df_f = cache.obtener((clave, 'df'), lambda: df.take(filas))
+    df_fuente = df_f
+    inc = cache.obtener((clave, 'get_pedidos_incumplimiento'),
+                        lambda: processor.get_pedidos_incumplimiento(df_f))
+    df_t = inc
+    return len(df_fuente) + len(df_t)
+
+
+def medir(rerun, reruns: int) -> dict:
+    """Tiempo medio (ms) y pico de memoria asignada (MB) por rerun, tras un rerun de calentamiento."""
+    rerun()
+    gc.collect()
+    inicio = time.perf_counter()
+    for _ in range(reruns):
+        rerun()
+    milisegundos = (time.perf_counter() - inicio) / reruns * 1000
+
+    picos = []
+    for _ in range(reruns):
+        gc.collect()
+        tracemalloc.start()
+        rerun()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        picos.append(pico)
+    return {'ms': round(milisegundos, 1), 'pico_mb': round(max(picos) / 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de memoria asignada por rerun')
+    parser.add_argument('archivo', nargs='?', default=ARCHIVO_EJEMPLO, help='Libro de ejemplo a replicar')
+    parser.add_argument('--filas', type=int, default=200_000, help='Filas del dataset procesado')
+    parser.add_argument('--reruns', type=int, default=3, help='Reruns medidos por ruta')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    df = armar_dataset(args.archivo, args.filas)
+    indice = IndiceFiltros(df)
+    selecciones = seleccion_ejemplo(df)
+    serializado = pickle.dumps(df)
+    print(f"Dataset: {len(df):,} filas × {df.shape[1]} columnas "
+          f"({df.memory_usage(deep=True).sum() / 1e6:.1f} MB en memoria) · "
+          f"filtro {selecciones} → {len(indice.filas(selecciones)):,} filas")
+
+    cache = CacheLRU()
+    rutas = {
+        'copias': lambda: rerun_copias(serializado, indice, selecciones),
+        'compartido (frío)': lambda: rerun_compartido(df, indice, selecciones, CacheLRU()),
+        'compartido (caliente)': lambda: rerun_compartido(df, indice, selecciones, cache),
+    }
+    for nombre, rerun in rutas.items():
+        r = medir(rerun, args.reruns)
+        print(f"{nombre:>21}: {r['ms']:>8.1f} ms/rerun | pico {r['pico_mb']:>8.1f} MB/rerun")
+
+
+if __name__ == '__main__':
+    main()
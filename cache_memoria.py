@@ -0,0 +1,156 @@
+"""
+CACHÉ EN MEMORIA DE SELECCIONES - TECU Aura
+Caché LRU acotada por tamaño para los resultados que dependen de la selección
+de filtros: filas filtradas, DataFrames filtrados y agregados derivados
+(indicadores, análisis por ciudad/transportadora/mes, incumplimientos,
+recomendaciones).
+
+Las claves combinan el digest del dataset, los parámetros SLA y la selección
+de filtros normalizada (ver IndiceFiltros.clave). Al superar el presupuesto
+de memoria se descartan las entradas menos usadas recientemente. Los
+archivos exportados (bytes) usan una instancia aparte con su propio presupuesto.
+"""
+
+from collections import OrderedDict
+import logging
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TAMANO_MAX_CACHE_BYTES = 128 * 1024 * 1024  # 128 MB
+TAMANO_MAX_EXPORTACIONES_BYTES = 256 * 1024 * 1024  # 256 MB (archivos exportados)
+
+
+def tamano_aproximado(valor) -> int:
+    """Huella en memoria aproximada (bytes) de un resultado cacheable."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(deep=True, index=True)
+        return int(uso.sum() if isinstance(valor, pd.DataFrame) else uso)
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(
+            tamano_aproximado(k) + tamano_aproximado(v) for k, v in valor.items()
+        )
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamano_aproximado(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+class CacheLRU:
+    """
+    Caché LRU con presupuesto en bytes, segura entre hilos (sesiones de Streamlit).
+
+    Los valores se comparten entre lecturas: quien los consume no debe
+    modificarlos en sitio.
+    """
+
+    def __init__(self, max_bytes: int = TAMANO_MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()  # clave → (valor, tamaño)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.descartes = 0
+
+    def obtener(self, clave, calcular):
+        """Retorna el valor en caché o lo calcula con calcular() y lo guarda."""
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._entradas[clave][0]
+            self.fallos += 1
+
+        # Se calcula fuera del lock: otras sesiones no esperan por este cálculo
+        valor = calcular()
+        self.guardar(clave, valor)
+        return valor
+
+    def guardar(self, clave, valor) -> None:
+        tamano = tamano_aproximado(valor)
+        if tamano > self.max_bytes:
+            logger.info(f"Resultado de {tamano / 1e6:.1f} MB excede la caché, no se guarda")
+            return
+        with self._lock:
+            if clave in self._entradas:
+                self._bytes -= self._entradas.pop(clave)[1]
+            self._entradas[clave] = (valor, tamano)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes:
+                _, (_, liberado) = self._entradas.popitem(last=False)
+                self._bytes -= liberado
+                self.descartes += 1
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estadisticas(self) -> dict:
+        """Aciertos, fallos, tasa de aciertos, entradas, descartes y memoria usada."""
+        consultas = self.aciertos + self.fallos
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': round(self.aciertos / consultas * 100, 1) if consultas else 0.0,
+            'entradas': len(self._entradas),
+            'descartes': self.descartes,
+            'mb_usados': round(self._bytes / 1e6, 2),
+        }
+
+
+class ProcesadorMemoizado:
+    """
+    Envoltorio de DataProcessor que sirve los métodos de análisis desde la caché.
+
+    Solo se memoizan las llamadas sobre DataFrames registrados con su clave de
+    selección (p. ej. el dataset completo y el filtrado actual); cualquier otra
+    llamada se delega sin cambios.
+    """
+
+    METODOS = (
+        'get_indicadores', 'get_analisis', 'get_analisis_ciudad', 'get_analisis_transportadora',
+        'get_analisis_mes', 'get_pedidos_incumplimiento', 'get_recomendaciones',
+    )
+
+    # Métodos que pueden responderse desde el cubo de agregados
+    METODOS_CUBO = (
+        'get_indicadores', 'get_analisis_ciudad', 'get_analisis_transportadora', 'get_analisis_mes',
+    )
+
+    def __init__(self, processor, cache: CacheLRU, frames: list):
+        """
+        Args:
+            processor: Instancia de DataProcessor
+            cache: Caché compartida
+            frames: Lista de tuplas (DataFrame, clave de selección, cubo o None)
+        """
+        self._processor = processor
+        self._cache = cache
+        # Se conserva la referencia al DataFrame para que su id() siga siendo válido
+        self._claves = {id(df): (df, clave, cubo) for df, clave, cubo in frames}
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._processor, nombre)
+        if nombre not in self.METODOS:
+            return atributo
+
+        def memoizado(df=None, *args, **kwargs):
+            registrado = self._claves.get(id(df))
+            if registrado is None or kwargs:
+                return atributo(df, *args, **kwargs)
+            _, clave, cubo = registrado
+            fuente = cubo if cubo is not None and nombre in self.METODOS_CUBO else df
+            # Argumentos adicionales (p. ej. agrupaciones) forman parte de la clave
+            extra = tuple(tuple(a) if isinstance(a, list) else a for a in args)
+            return self._cache.obtener((clave, nombre) + extra, lambda: atributo(fuente, *args))
+
+        return memoizado
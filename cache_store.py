@@ -0,0 +1,219 @@
+"""
+CACHÉ PERSISTENTE DE DATOS PROCESADOS - TECU Aura
+Guarda los DataFrames procesados en disco (Parquet) para que reinicios de la
+app y nuevas cargas del mismo libro no vuelvan a leer ni procesar el Excel.
+
+La clave combina el digest del contenido del archivo, los parámetros SLA y la
+versión del procesador (constante + huella del código de procesamiento), de
+modo que cualquier cambio en readers.py, data_processor.py o utils.py
+invalida las entradas anteriores. El directorio tiene un tope de tamaño y de entradas:
+al superarlo se eliminan las menos usadas recientemente.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_CACHE = os.path.join(DIRECTORIO_BASE, '.cache', 'procesados')
+
+# Módulos cuyo código fuente forma parte de la versión del procesador: los que
+# intervienen en la lectura (hoja, encabezado, tipos) y la limpieza del libro
+MODULOS_PROCESAMIENTO = ['readers.py', 'data_processor.py', 'utils.py']
+
+# Columna reservada con las huellas por fila del libro crudo (recarga incremental)
+COLUMNA_HUELLAS = '_huella_fila'
+
+# Tope del directorio de caché (cada versión nueva de un libro es una entrada nueva)
+TAMANO_MAX_CACHE_BYTES = 512 * 1024 * 1024
+MAX_ENTRADAS_CACHE = 200
+
+
+def digest_bytes(archivo_bytes: bytes) -> str:
+    """Huella SHA-256 del contenido del archivo."""
+    return hashlib.sha256(archivo_bytes).hexdigest()
+
+
+def _calcular_version() -> str:
+    from data_processor import VERSION_PROCESADOR
+
+    h = hashlib.sha256(VERSION_PROCESADOR.encode())
+    for nombre in MODULOS_PROCESAMIENTO:
+        with open(os.path.join(DIRECTORIO_BASE, nombre), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+
+_version = None
+
+
+def version_procesador() -> str:
+    """Versión efectiva del procesador (se calcula una vez por proceso)."""
+    global _version
+    if _version is None:
+        _version = _calcular_version()
+    return _version
+
+
+def clave_cache(digest: str, sla: tuple = None) -> str:
+    """Clave de la entrada: versión + digest + parámetros SLA (o 'base' sin SLA)."""
+    sufijo = '-'.join(str(v) for v in sla) if sla is not None else 'base'
+    return f"{version_procesador()}_{digest}_{sufijo}"
+
+
+def _arrow_disponible() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def preparar_para_arrow(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Columnas object con tipos mezclados (p. ej. No_Guia con números y texto)
+    no son representables en Arrow: se guardan como texto, igual que las
+    muestra st.dataframe. Los valores nulos se conservan y el resto de
+    columnas no se copia.
+    """
+    mixtas = [
+        c for c in df.columns
+        if df[c].dtype == object and pd.api.types.infer_dtype(df[c], skipna=True).startswith('mixed')
+    ]
+    if not mixtas:
+        return df
+    return df.assign(**{c: df[c].where(df[c].isna(), df[c].astype(str)) for c in mixtas})
+
+
+def leer(clave: str):
+    """
+    Busca una entrada en disco.
+
+    Returns:
+        Tupla (DataFrame, metadatos dict) o None si no existe / no se puede leer.
+        Si la entrada se guardó con huellas, van en meta['huellas'] (no en el DataFrame)
+    """
+    ruta = os.path.join(DIRECTORIO_CACHE, f"{clave}.parquet")
+    if not os.path.exists(ruta) or not _arrow_disponible():
+        return None
+
+    import pyarrow.parquet as pq
+
+    try:
+        tabla = pq.read_table(ruta)
+        meta = json.loads((tabla.schema.metadata or {}).get(b'tecu', b'{}'))
+        df = tabla.to_pandas()
+        if COLUMNA_HUELLAS in df.columns:
+            meta['huellas'] = df.pop(COLUMNA_HUELLAS).to_numpy()
+    except Exception as e:
+        logger.warning(f"Entrada de caché ilegible, se descarta: {ruta} ({e})")
+        _borrar(ruta)
+        return None
+
+    try:
+        os.utime(ruta)  # La fecha de modificación marca el último uso (desalojo en aplicar_limite)
+    except OSError:
+        pass
+    logger.info(f"Caché en disco: acierto {clave} ({len(df)} filas)")
+    return df, meta
+
+
+def guardar(clave: str, df: pd.DataFrame, meta: dict = None, huellas=None) -> bool:
+    """
+    Escribe la entrada de forma atómica, elimina entradas de versiones anteriores
+    y desaloja las menos usadas si el directorio supera el tope.
+    `huellas` (opcional, una por fila de df) se guarda en la columna reservada.
+    """
+    if not _arrow_disponible():
+        logger.warning("pyarrow no está instalado: caché en disco deshabilitada")
+        return False
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    ruta = os.path.join(DIRECTORIO_CACHE, f"{clave}.parquet")
+    try:
+        os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+        if huellas is not None:
+            df = df.assign(**{COLUMNA_HUELLAS: huellas})
+        tabla = pa.Table.from_pandas(preparar_para_arrow(df))
+        metadata = dict(tabla.schema.metadata or {})
+        metadata[b'tecu'] = json.dumps(meta or {}).encode()
+        tabla = tabla.replace_schema_metadata(metadata)
+
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        pq.write_table(tabla, temporal)
+        os.replace(temporal, ruta)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar en caché {clave}: {e}")
+        return False
+
+    logger.info(f"Caché en disco: guardado {clave} ({len(df)} filas)")
+    limpiar_obsoletos()
+    aplicar_limite(conservar=ruta)
+    return True
+
+
+def limpiar_obsoletos() -> int:
+    """Elimina entradas creadas por otra versión del procesador. Retorna cuántas borró."""
+    if not os.path.isdir(DIRECTORIO_CACHE):
+        return 0
+    prefijo = f"{version_procesador()}_"
+    borradas = 0
+    for nombre in os.listdir(DIRECTORIO_CACHE):
+        if nombre.endswith('.parquet') and not nombre.startswith(prefijo):
+            borradas += _borrar(os.path.join(DIRECTORIO_CACHE, nombre))
+    if borradas:
+        logger.info(f"Caché en disco: {borradas} entradas obsoletas eliminadas")
+    return borradas
+
+
+def aplicar_limite(tamano_max: int = TAMANO_MAX_CACHE_BYTES, max_entradas: int = MAX_ENTRADAS_CACHE,
+                   conservar: str = None) -> int:
+    """
+    Elimina entradas, de la usada hace más tiempo a la más reciente, hasta que
+    el directorio quede dentro del tope de tamaño y de entradas. `conservar`
+    (la entrada recién escrita) nunca se elimina. Retorna cuántas borró.
+    """
+    if not os.path.isdir(DIRECTORIO_CACHE):
+        return 0
+    entradas = []
+    for nombre in os.listdir(DIRECTORIO_CACHE):
+        ruta = os.path.join(DIRECTORIO_CACHE, nombre)
+        if not nombre.endswith('.parquet'):
+            continue
+        try:
+            estado = os.stat(ruta)
+        except OSError:
+            continue
+        entradas.append((estado.st_mtime, estado.st_size, ruta))
+    entradas.sort()  # Más antigua primero
+
+    tamano = sum(e[1] for e in entradas)
+    cantidad = len(entradas)
+    borradas = 0
+    for _, peso, ruta in entradas:
+        if tamano <= tamano_max and cantidad <= max_entradas:
+            break
+        if ruta == conservar:
+            continue
+        if _borrar(ruta):
+            tamano -= peso
+            cantidad -= 1
+            borradas += 1
+    if borradas:
+        logger.info(f"Caché en disco: {borradas} entradas desalojadas por el tope ({tamano / 1e6:.1f} MB)")
+    return borradas
+
+
+def _borrar(ruta: str) -> int:
+    try:
+        os.remove(ruta)
+        return 1
+    except OSError:
+        return 0
@@ -6,21 +6,92 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import io
+import weakref
+
+from exportador import exportar_excel
+from utils import calcular_dias_habiles_series, INDICE_CIUDADES_PRINCIPALES
+
+# Subir al cambiar reglas de negocio sin tocar código (p. ej. mapeos externos);
+# los cambios de código ya invalidan la caché en disco por sí solos.
+VERSION_PROCESADOR = '1'
+
+# Rangos de los sliders "Configuración SLA" (días hábiles)
+RANGO_SLA_ALMACEN = range(1, 6)
+RANGO_SLA_PRINCIPAL = range(1, 4)
+RANGO_SLA_OTRAS = range(3, 6)
+
+# ─────────────────────────────────────────────
+# Esquema compacto del DataFrame procesado
+# ─────────────────────────────────────────────
+# Dimensiones de texto → category (códigos enteros + diccionario de valores)
+COLUMNAS_CATEGORICAS = [
+    'Mes_Label', 'Concepto', 'Categoria', 'Ciudad', 'Transportadora',
+    'Cumple_NNS', 'Area_Incumple', 'Causal_Incumplimiento',
+]
+# Conteos de días y desvíos (enteros) → el menor tipo entero que los contiene
+COLUMNAS_ENTERAS = [
+    'Mes_Sort', 'Dias_Entrega_Hab', 'Dias_Despacho_Hab',
+    'SLA_Entrega', 'Desvio_Entrega', 'Desvio_Despacho',
+]
+# Valores que la etapa SLA escribe en columnas categóricas
+VALORES_ETAPA_SLA = {'Cumple_NNS': ['Cumple', 'No cumple', 'PTE'], 'Area_Incumple': ['']}
+
+
+def indicadores_vacios() -> dict:
+    """KPIs de un conjunto sin pedidos (mismas claves y orden que get_indicadores)."""
+    return {
+        'total_pedidos': 0, 'pct_cumplimiento': 0.0, 'cumplen_nns': 0, 'no_cumplen_nns': 0,
+        'con_desvio_despacho': 0, 'promedio_desvio_despacho': 0.0,
+        'con_desvio_entrega': 0, 'promedio_desvio_entrega': 0.0, 'pendientes': 0,
+    }
 
 
 class DataProcessor:
     """Clase principal para procesar datos de despachos TECU."""
     
     def __init__(self, df: pd.DataFrame):
-        """Inicializa el procesador con el DataFrame crudo."""
-        self.df_original = df.copy()
+        """Inicializa el procesador con el DataFrame crudo (compartido, no se copia ni se modifica)."""
+        self.df_original = df
+        self.df_limpio = None
         self.df_procesado = None
+        self._memo_indicadores = {}  # id(df) → (weakref al DataFrame, indicadores)
     
     def procesar(self, sla_almacen: int = 1, sla_principal: int = 3, sla_otras: int = 5) -> pd.DataFrame:
         """
         Procesa el DataFrame aplicando transformaciones y cálculos de SLA.
+        Equivale a limpiar() seguido de aplicar_sla().
         """
-        df = self.df_original.copy()
+        df = self.aplicar_sla(self.limpiar(), sla_almacen, sla_principal, sla_otras)
+        
+        # ── GUARDAR DATAFRAME PROCESADO ──────────────────────────────────────────────
+        self.df_procesado = df
+        return df
+    
+    @staticmethod
+    def procesar_en_bloques(bloques, sla_almacen: int = 1, sla_principal: int = 3,
+                            sla_otras: int = 5) -> 'AcumuladorCumplimiento':
+        """
+        Modo streaming de procesar() para historias que no caben en un DataFrame:
+        cada bloque crudo (p. ej. de readers.leer_csv_por_bloques) se limpia, se
+        evalúa con el SLA y se suma a un AcumuladorCumplimiento. Solo un bloque
+        está en memoria a la vez; la limpieza y el SLA son fila a fila, así que
+        los KPIs y análisis son los mismos que sobre el conjunto completo.
+        
+        Returns:
+            AcumuladorCumplimiento (acepta get_indicadores y get_analisis)
+        """
+        acumulador = AcumuladorCumplimiento()
+        for bloque in bloques:
+            if len(bloque):
+                acumulador.agregar(DataProcessor(bloque).procesar(sla_almacen, sla_principal, sla_otras))
+        return acumulador
+    
+    def limpiar(self) -> pd.DataFrame:
+        """
+        Etapa de limpieza y normalización (independiente de los parámetros SLA):
+        columnas, meses, fechas, valores monetarios, días hábiles y textos.
+        """
+        df = self.df_original.copy(deep=False)  # Vista: las columnas se copian al modificarse
         
         # ── LIMPIEZA BÁSICA ──────────────────────────────────────────────
         df = df.dropna(how='all')  # Eliminar filas completamente vacías
@@ -105,41 +176,21 @@ class DataProcessor:
                 r'[^\d.]', '', regex=True
             ).replace('', '0').astype(float)
         
-        # ── CALCULAR DÍAS DE ENTREGA Y DESPACHO ──────────────────────────────────────────────
+        # ── CALCULAR DÍAS HÁBILES DE ENTREGA Y DESPACHO ──────────────────────────────────────────────
+        # Días hábiles transcurridos desde la venta: se cuenta desde el día siguiente
+        # a la fecha de venta hasta la fecha final (incluida), sin fines de semana ni festivos
+        if 'Fecha' in df.columns:
+            inicio_conteo = df['Fecha'] + pd.Timedelta(days=1)
+        
         if 'Fecha' in df.columns and 'Fecha_Entrega' in df.columns:
-            df['Dias_Entrega_Hab'] = (df['Fecha_Entrega'] - df['Fecha']).dt.days
+            df['Dias_Entrega_Hab'] = calcular_dias_habiles_series(inicio_conteo, df['Fecha_Entrega'])
             df['Dias_Entrega_Hab'] = df['Dias_Entrega_Hab'].clip(lower=0).fillna(0)
         
         if 'Fecha' in df.columns and 'Fecha_Despacho' in df.columns:
-            df['Dias_Despacho_Hab'] = (df['Fecha_Despacho'] - df['Fecha']).dt.days
+            df['Dias_Despacho_Hab'] = calcular_dias_habiles_series(inicio_conteo, df['Fecha_Despacho'])
             df['Dias_Despacho_Hab'] = df['Dias_Despacho_Hab'].clip(lower=0).fillna(0)
         
-        # ── CALCULAR DESVÍOS ──────────────────────────────────────────────
-        df['Desvio_Entrega'] = 0.0
-        df['Desvio_Despacho'] = 0.0
-        
-        ciudades_principales = ['Bogotá', 'Medellín', 'Cali', 'Bogotá y alrededores']
-        
-        if 'Dias_Entrega_Hab' in df.columns:
-            for idx, row in df.iterrows():
-                if pd.isna(row.get('Fecha_Entrega')):
-                    continue
-                ciudad = str(row.get('Ciudad', '')).lower()
-                dias = row.get('Dias_Entrega_Hab', 0)
-                
-                if any(cp.lower() in ciudad for cp in ciudades_principales):
-                    sla = sla_principal
-                else:
-                    sla = sla_otras
-                
-                if dias > sla:
-                    df.at[idx, 'Desvio_Entrega'] = dias - sla
-        
-        if 'Dias_Despacho_Hab' in df.columns:
-            df['Desvio_Despacho'] = df['Dias_Despacho_Hab'].clip(lower=0)
-            df.loc[df['Desvio_Despacho'] <= sla_almacen, 'Desvio_Despacho'] = 0
-        
-        # ── NORMALIZAR CUMPLIMIENTO NNS ──────────────────────────────────────────────
+        # ── NORMALIZAR CUMPLIMIENTO NNS (veredicto del archivo) ──────────────────────────────────────────────
         if 'Cumple_NNS' in df.columns:
             df['Cumple_NNS'] = df['Cumple_NNS'].astype(str).str.strip()
             
@@ -151,19 +202,10 @@ class DataProcessor:
                 'FALSO': 'PTE', 'Falso': 'PTE', 'falso': 'PTE',
                 '0': 'PTE',
             })
-            
-            mask_cumple = (df['Cumple_NNS'].isin(['', 'nan', 'NAN'])) & (df['Fecha_Entrega'].notna())
-            df.loc[mask_cumple, 'Cumple_NNS'] = 'Cumple'
-            
-            mask_pte = df['Fecha_Entrega'].isna()
-            df.loc[mask_pte, 'Cumple_NNS'] = 'PTE'
-        else:
-            df['Cumple_NNS'] = 'PTE'
         
         # ── NORMALIZAR ÁREA DE INCUMPLIMIENTO ──────────────────────────────────────────────
         if 'Area_Incumple' in df.columns:
             df['Area_Incumple'] = df['Area_Incumple'].astype(str).str.strip()
-            df.loc[df['Cumple_NNS'] == 'Cumple', 'Area_Incumple'] = ''
         else:
             df['Area_Incumple'] = ''
         
@@ -171,115 +213,391 @@ class DataProcessor:
         if 'Causal_Incumplimiento' not in df.columns:
             df['Causal_Incumplimiento'] = ''
         
-        # ── GUARDAR DATAFRAME PROCESADO ──────────────────────────────────────────────
-        self.df_procesado = df
+        # ── ESQUEMA COMPACTO: categorías y enteros pequeños ──────────────────────────────────────────────
+        df = self.aplicar_esquema(df)
+        
+        self.df_limpio = df
+        return df
+    
+    @staticmethod
+    def huellas_filas(df_crudo: pd.DataFrame) -> np.ndarray:
+        """Huella de contenido (uint64) de cada fila cruda, independiente del índice."""
+        return pd.util.hash_pandas_object(df_crudo, index=False).to_numpy()
+    
+    def limpiar_incremental(self, anterior: 'InstantaneaLimpieza' = None) -> 'InstantaneaLimpieza':
+        """
+        Limpieza de una nueva versión del libro reutilizando la instantánea de la
+        versión anterior: solo las filas crudas cuyo contenido no aparece en la
+        instantánea pasan por limpiar() (fechas, valores, días hábiles); el resto
+        se toma ya limpio. La limpieza es fila a fila, así que el resultado es el
+        mismo que limpiar() sobre el libro completo.
+        
+        Sin instantánea, o si cambiaron las columnas del libro o sus tipos (las
+        huellas dependen del tipo de cada columna), se limpia todo.
+        
+        Returns:
+            InstantaneaLimpieza con el DataFrame limpio y sus huellas
+        """
+        crudo = self.df_original
+        huellas = self.huellas_filas(crudo)
+        columnas = tuple((str(c), str(t)) for c, t in crudo.dtypes.items())
+        
+        def completa():
+            df = self.limpiar()
+            return InstantaneaLimpieza(df, huellas[crudo.index.get_indexer(df.index)], columnas)
+        
+        if anterior is None or anterior.huellas is None or anterior.columnas != columnas:
+            return completa()
+        
+        # Posición en la instantánea anterior de cada fila cruda con el mismo contenido (-1 = cambió)
+        previas = pd.Index(anterior.huellas)
+        unicas = ~previas.duplicated()
+        origen = previas[unicas].get_indexer(huellas)
+        origen = np.where(origen >= 0, np.flatnonzero(unicas)[origen], -1)
+        cambiadas = origen < 0
+        # Filas sin cambios descartadas por la limpieza (vacías, sin No orden) no están en la
+        # instantánea: se limpian de nuevo y se vuelven a descartar
+        if not cambiadas.any() and np.array_equal(origen, np.arange(len(anterior.df_limpio))):
+            df = anterior.df_limpio  # Mismo contenido y orden: se comparte tal cual
+            return InstantaneaLimpieza(df, anterior.huellas, columnas)
+        
+        reutilizadas = anterior.df_limpio.take(origen[~cambiadas])
+        reutilizadas.index = crudo.index[~cambiadas]
+        parcial = DataProcessor(crudo[cambiadas]).limpiar()
+        if len(parcial) == 0:
+            df = reutilizadas
+        elif set(parcial.columns) != set(reutilizadas.columns):
+            return completa()  # Columnas derivadas distintas entre bloques
+        else:
+            parcial = parcial[reutilizadas.columns]
+            for columna, tipo in reutilizadas.dtypes.items():
+                if isinstance(tipo, pd.CategoricalDtype):
+                    # Categorías unidas: la concatenación conserva el tipo sin recodificar
+                    nuevas = pd.Index(parcial[columna].dropna().unique()).difference(tipo.categories)
+                    if len(nuevas):
+                        reutilizadas[columna] = reutilizadas[columna].cat.add_categories(nuevas)
+                    parcial[columna] = parcial[columna].astype(reutilizadas[columna].dtype)
+                elif parcial[columna].dtype != tipo and not pd.api.types.is_numeric_dtype(tipo):
+                    # Texto o fechas inferidos distinto en el bloque nuevo (p. ej. columna vacía)
+                    try:
+                        parcial[columna] = parcial[columna].astype(tipo)
+                    except (TypeError, ValueError):
+                        pass
+            df = self.aplicar_esquema(pd.concat([reutilizadas, parcial]).sort_index(kind='stable'))
+        self.df_limpio = df
+        return InstantaneaLimpieza(df, huellas[crudo.index.get_indexer(df.index)], columnas)
+    
+    @staticmethod
+    def aplicar_sla(df_limpio: pd.DataFrame, sla_almacen: int = 1, sla_principal: int = 3,
+                    sla_otras: int = 5) -> pd.DataFrame:
+        """
+        Etapa SLA: calcula SLA_Entrega, desvíos, Cumple_NNS y área responsable
+        sobre un DataFrame ya limpio. No modifica df_limpio, de modo que el
+        resultado de limpiar() puede reutilizarse para cualquier combinación SLA;
+        el resultado comparte con él las columnas que la etapa no modifica.
+        """
+        df = df_limpio.copy(deep=False)
+        
+        # ── CALCULAR DESVÍOS ──────────────────────────────────────────────
+        df['Desvio_Entrega'] = 0.0
+        df['Desvio_Despacho'] = 0.0
+        df['SLA_Entrega'] = np.where(DataProcessor._es_ciudad_principal(df), sla_principal, sla_otras)
+        
+        if 'Dias_Entrega_Hab' in df.columns:
+            exceso = df['Dias_Entrega_Hab'] - df['SLA_Entrega']
+            con_desvio = df['Fecha_Entrega'].notna() & (exceso > 0)
+            df['Desvio_Entrega'] = exceso.where(con_desvio, 0.0)
+        
+        if 'Dias_Despacho_Hab' in df.columns:
+            df['Desvio_Despacho'] = df['Dias_Despacho_Hab'].clip(lower=0)
+            df.loc[df['Desvio_Despacho'] <= sla_almacen, 'Desvio_Despacho'] = 0
+        
+        return DataProcessor.aplicar_esquema(DataProcessor._evaluar_cumplimiento(df))
+    
+    @staticmethod
+    def aplicar_esquema(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convierte las columnas del esquema compacto (modifica df):
+        - COLUMNAS_CATEGORICAS de solo texto → category
+        - COLUMNAS_ENTERAS sin vacíos y con valores enteros → int8/int16/int32
+        
+        Las columnas con tipos mezclados o decimales se dejan como están.
+        """
+        for columna in COLUMNAS_CATEGORICAS:
+            if columna not in df.columns or isinstance(df[columna].dtype, pd.CategoricalDtype):
+                continue
+            if pd.api.types.infer_dtype(df[columna], skipna=True) in ('string', 'empty'):
+                df[columna] = df[columna].astype('category')
+        
+        for columna in COLUMNAS_ENTERAS:
+            if columna not in df.columns or not pd.api.types.is_numeric_dtype(df[columna]):
+                continue
+            serie = df[columna]
+            if pd.api.types.is_integer_dtype(serie):
+                compacta = pd.to_numeric(serie, downcast='integer')
+            else:
+                valores = serie.to_numpy()
+                if not (len(valores) and np.isfinite(valores).all() and (valores == np.round(valores)).all()):
+                    continue
+                compacta = pd.to_numeric(serie.astype('int64'), downcast='integer')
+            # Solo se reasigna si cambia el tipo: las columnas ya compactas siguen compartidas
+            if compacta.dtype != serie.dtype:
+                df[columna] = compacta
         return df
     
+    @staticmethod
+    def memoria_esquema(df: pd.DataFrame) -> dict:
+        """
+        Memoria del DataFrame con el esquema compacto frente a los tipos sin compactar
+        (texto para las categorías, int64 para los enteros).
+        
+        Returns:
+            Dict con con_esquema_mb, sin_esquema_mb, ahorro_mb y ahorro_pct
+        """
+        con_esquema = int(df.memory_usage(deep=True, index=False).sum())
+        sin_esquema = con_esquema
+        for columna in df.columns:
+            serie = df[columna]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                expandida = serie.astype(serie.cat.categories.dtype)
+            elif columna in COLUMNAS_ENTERAS and pd.api.types.is_integer_dtype(serie):
+                expandida = serie.astype('int64')
+            else:
+                continue
+            sin_esquema += expandida.memory_usage(deep=True, index=False) - serie.memory_usage(deep=True, index=False)
+        ahorro = sin_esquema - con_esquema
+        return {
+            'con_esquema_mb': round(con_esquema / 1e6, 2),
+            'sin_esquema_mb': round(sin_esquema / 1e6, 2),
+            'ahorro_mb': round(ahorro / 1e6, 2),
+            'ahorro_pct': round(ahorro / sin_esquema * 100, 1) if sin_esquema else 0.0,
+        }
+
+    @staticmethod
+    def claves_pedido(df: pd.DataFrame) -> tuple:
+        """
+        Huella (uint64) del pedido de cada fila: No_Orden normalizado o, si
+        falta, No_Guia (en espacios de clave separados).
+
+        La normalización iguala los números que un libro exporta como texto y
+        otro como decimal ('100245' y '100245.0').
+
+        Returns:
+            Tupla (huellas np.uint64, máscara de filas con clave)
+        """
+        def normalizar(columna):
+            if columna not in df.columns:
+                return pd.Series(pd.NA, index=df.index, dtype='object')
+            texto = df[columna].astype(str).str.strip().str.upper().str.replace(r'\.0+$', '', regex=True)
+            return texto.where(df[columna].notna() & ~texto.isin(['', 'NAN', 'NONE']))
+
+        clave = ('O:' + normalizar('No_Orden')).fillna('G:' + normalizar('No_Guia'))
+        con_clave = clave.notna().to_numpy()
+        huellas = pd.util.hash_array(clave.fillna('').to_numpy(dtype=object))
+        return huellas, con_clave
+
+    @staticmethod
+    def combinar_limpios(frames: list) -> tuple:
+        """
+        Une los DataFrames limpios de varios libros (en orden de carga) en un solo
+        dataset, con la regla "el último escribe": cada pedido conserva todas sus
+        filas del último libro que lo trae (ver claves_pedido). Las filas sin
+        No_Orden ni No_Guia se conservan todas.
+
+        Costo lineal en el total de filas (una tabla hash sobre las huellas); la
+        etapa SLA se aplica después una sola vez sobre el resultado.
+
+        Returns:
+            Tupla (DataFrame combinado con esquema compacto, resumen dict con
+            archivos, filas_leidas, filas_reemplazadas y pedidos_repetidos)
+        """
+        fuente = np.repeat(np.arange(len(frames)), [len(f) for f in frames])
+        df = pd.concat(frames, ignore_index=True)
+        huellas, con_clave = DataProcessor.claves_pedido(df)
+
+        # Primer y último libro en que aparece cada pedido
+        codigos, unicos = pd.factorize(huellas)
+        ultimo = np.zeros(len(unicos), dtype=fuente.dtype)
+        primero = np.full(len(unicos), len(frames), dtype=fuente.dtype)
+        np.maximum.at(ultimo, codigos[con_clave], fuente[con_clave])
+        np.minimum.at(primero, codigos[con_clave], fuente[con_clave])
+        conservar = ~con_clave | (fuente == ultimo[codigos])
+
+        resumen = {
+            'archivos': len(frames),
+            'filas_leidas': len(df),
+            'filas_reemplazadas': int((~conservar).sum()),
+            'pedidos_repetidos': int((primero < ultimo).sum()),
+        }
+        df = df[conservar].reset_index(drop=True)
+        return DataProcessor.aplicar_esquema(df), resumen
+
+    @staticmethod
+    def _es_ciudad_principal(df: pd.DataFrame) -> np.ndarray:
+        """Máscara por fila de ciudad principal (una evaluación por ciudad distinta)."""
+        if 'Ciudad' not in df.columns:
+            return np.zeros(len(df), dtype=bool)
+        codigos, ciudades_unicas = pd.factorize(df['Ciudad'])
+        # Última posición: ciudades vacías (código -1)
+        es_principal = np.append(INDICE_CIUDADES_PRINCIPALES.clasificar(ciudades_unicas), False)
+        return es_principal[codigos]
+    
+    @staticmethod
+    def _evaluar_cumplimiento(df: pd.DataFrame) -> pd.DataFrame:
+        """Completa Cumple_NNS y Area_Incumple a partir de Desvio_Entrega (modifica df)."""
+        # Columnas categóricas: los valores que se escriben deben existir como categorías
+        for columna, valores in VALORES_ETAPA_SLA.items():
+            if columna in df.columns and isinstance(df[columna].dtype, pd.CategoricalDtype):
+                nuevos = [v for v in valores if v not in df[columna].cat.categories]
+                if nuevos:
+                    df[columna] = df[columna].cat.add_categories(nuevos)
+        
+        # ── EVALUAR CUMPLIMIENTO NNS ──────────────────────────────────────────────
+        if 'Cumple_NNS' in df.columns:
+            # Pedidos entregados sin veredicto en el archivo: evaluar con el desvío hábil calculado
+            mask_evaluar = (~df['Cumple_NNS'].isin(['Cumple', 'No cumple'])) & (df['Fecha_Entrega'].notna())
+            df.loc[mask_evaluar, 'Cumple_NNS'] = np.where(
+                df.loc[mask_evaluar, 'Desvio_Entrega'] > 0, 'No cumple', 'Cumple'
+            )
+            
+            mask_pte = df['Fecha_Entrega'].isna()
+            df.loc[mask_pte, 'Cumple_NNS'] = 'PTE'
+        else:
+            df['Cumple_NNS'] = 'PTE'
+        
+        # ── ÁREA DE INCUMPLIMIENTO: vacía para pedidos que cumplen ──────────────────────────────────────────────
+        df.loc[df['Cumple_NNS'] == 'Cumple', 'Area_Incumple'] = ''
+        
+        return df
+    
+    @staticmethod
+    def construir_cubo(df_procesado: pd.DataFrame) -> 'CuboCumplimiento':
+        """Cubo de agregados de cumplimiento para KPIs y análisis sin recorrer filas."""
+        return CuboCumplimiento(df_procesado)
+    
+    @staticmethod
+    def matriz_sla(df_limpio: pd.DataFrame) -> 'MatrizSLA':
+        """Precalcula desvíos y cumplimiento para todas las combinaciones SLA de los sliders."""
+        return MatrizSLA(df_limpio)
+    
     def get_indicadores(self, df: pd.DataFrame) -> dict:
-        """Calcula los KPIs principales del dashboard."""
+        """Calcula los KPIs principales del dashboard (acepta DataFrame, CuboCumplimiento o AcumuladorCumplimiento)."""
+        if isinstance(df, (CuboCumplimiento, AcumuladorCumplimiento)):
+            return df.indicadores()
+        
         if df is None or len(df) == 0:
-            return {
-                'total_pedidos': 0, 'pct_cumplimiento': 0.0, 'cumplen_nns': 0,
-                'con_desvio_despacho': 0, 'promedio_desvio_despacho': 0.0,
-                'con_desvio_entrega': 0, 'promedio_desvio_entrega': 0.0, 'pendientes': 0,
-            }
+            return indicadores_vacios()
+        
+        # Memo por identidad del DataFrame: cada conjunto se calcula una vez por rerun
+        memo = self._memo_indicadores.get(id(df))
+        if memo is not None and memo[0]() is df:
+            return dict(memo[1])
         
+        ind = self._calcular_indicadores(df)
+        clave = id(df)
+        # La entrada se descarta sola cuando el DataFrame deja de existir
+        ref = weakref.ref(df, lambda _, memo=self._memo_indicadores, clave=clave: memo.pop(clave, None))
+        self._memo_indicadores[clave] = (ref, ind)
+        return dict(ind)
+    
+    @staticmethod
+    def _calcular_indicadores(df: pd.DataFrame) -> dict:
+        """Una pasada por columna con NumPy, sin DataFrames intermedios."""
         total_pedidos = len(df)
         
         if 'Cumple_NNS' in df.columns:
-            cumplen = len(df[df['Cumple_NNS'] == 'Cumple'])
-            no_cumplen = len(df[df['Cumple_NNS'] == 'No cumple'])
-            pendientes = len(df[df['Cumple_NNS'] == 'PTE'])
-            pct_cumplimiento = round((cumplen / len(df) * 100), 1) if len(df) > 0 else 0.0
+            codigos, valores = pd.factorize(df['Cumple_NNS'])
+            conteo = dict(zip(valores, np.bincount(codigos[codigos >= 0], minlength=len(valores))))
+            cumplen = int(conteo.get('Cumple', 0))
+            no_cumplen = int(conteo.get('No cumple', 0))
+            pendientes = int(conteo.get('PTE', 0))
+            pct_cumplimiento = round((cumplen / total_pedidos * 100), 1)
         else:
             cumplen = no_cumplen = pendientes = 0
             pct_cumplimiento = 0.0
         
-        if 'Desvio_Despacho' in df.columns:
-            con_desvio_despacho = len(df[df['Desvio_Despacho'] > 0])
-            promedio_desvio_despacho = round(
-                df.loc[df['Desvio_Despacho'] > 0, 'Desvio_Despacho'].mean(), 1
-            ) if con_desvio_despacho > 0 else 0.0
-        else:
-            con_desvio_despacho = 0
-            promedio_desvio_despacho = 0.0
-        
-        if 'Desvio_Entrega' in df.columns:
-            con_desvio_entrega = len(df[df['Desvio_Entrega'] > 0])
-            promedio_desvio_entrega = round(
-                df.loc[df['Desvio_Entrega'] > 0, 'Desvio_Entrega'].mean(), 1
-            ) if con_desvio_entrega > 0 else 0.0
-        else:
-            con_desvio_entrega = 0
-            promedio_desvio_entrega = 0.0
+        desvios = {}
+        for columna in ('Desvio_Despacho', 'Desvio_Entrega'):
+            if columna in df.columns:
+                valores = df[columna].to_numpy(dtype='float64', na_value=np.nan)
+                con_desvio = valores > 0
+                cantidad = int(con_desvio.sum())
+                promedio = round(valores.sum(where=con_desvio) / cantidad, 1) if cantidad > 0 else 0.0
+            else:
+                cantidad, promedio = 0, 0.0
+            desvios[columna] = (cantidad, promedio)
         
         return {
             'total_pedidos': total_pedidos,
             'pct_cumplimiento': pct_cumplimiento,
             'cumplen_nns': cumplen,
             'no_cumplen_nns': no_cumplen,
-            'con_desvio_despacho': con_desvio_despacho,
-            'promedio_desvio_despacho': promedio_desvio_despacho,
-            'con_desvio_entrega': con_desvio_entrega,
-            'promedio_desvio_entrega': promedio_desvio_entrega,
+            'con_desvio_despacho': desvios['Desvio_Despacho'][0],
+            'promedio_desvio_despacho': desvios['Desvio_Despacho'][1],
+            'con_desvio_entrega': desvios['Desvio_Entrega'][0],
+            'promedio_desvio_entrega': desvios['Desvio_Entrega'][1],
             'pendientes': pendientes,
         }
     
-    def get_analisis_ciudad(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Genera análisis de cumplimiento agrupado por ciudad."""
-        if 'Ciudad' not in df.columns or len(df) == 0:
-            return pd.DataFrame()
+    @staticmethod
+    def get_analisis(df, agrupaciones: list = None) -> dict:
+        """
+        Tablas de análisis para varios conjuntos de agrupación en una pasada vectorizada.
         
-        analisis = df.groupby('Ciudad').agg(
-            Total=('No_Orden', 'count'),
-            Cumplen=('Cumple_NNS', lambda x: (x == 'Cumple').sum()),
-            No_Cumplen=('Cumple_NNS', lambda x: (x == 'No cumple').sum())
-        ).reset_index()
+        Las columnas indicadoras (órdenes, cumple / no cumple, desvío, valor) se
+        calculan una sola vez y cada conjunto se resuelve con sumas por grupo,
+        sin funciones Python por grupo. Acepta DataFrame, CuboCumplimiento
+        (solo los conjuntos cuyas columnas son dimensiones) o AcumuladorCumplimiento.
         
-        analisis['Pct_Cumplimiento'] = (analisis['Cumplen'].astype(float) / analisis['Total'].astype(float) * 100).round(1).fillna(0)
-        analisis = analisis.sort_values('Total', ascending=False)
+        Args:
+            df: DataFrame procesado (o filtrado), CuboCumplimiento o AcumuladorCumplimiento
+            agrupaciones: Nombres de AGRUPACIONES_ANALISIS; None = todas
+            
+        Returns:
+            Dict nombre → DataFrame (vacío si faltan columnas o datos)
+        """
+        agrupaciones = list(agrupaciones or AGRUPACIONES_ANALISIS)
+        if isinstance(df, AcumuladorCumplimiento):
+            return df.analisis(agrupaciones)
+        tablas = {nombre: pd.DataFrame() for nombre in agrupaciones}
+        if df is None or len(df) == 0:
+            return tablas
+        
+        if isinstance(df, CuboCumplimiento):
+            disponibles = [n for n in agrupaciones if all(df.tiene(c) for c in AGRUPACIONES_ANALISIS[n])]
+            for nombre in disponibles:
+                sumas = df.agrupar(AGRUPACIONES_ANALISIS[nombre])
+                tablas[nombre] = _formatear_analisis(nombre, sumas)
+            return tablas
         
-        return analisis
+        disponibles = [n for n in agrupaciones if all(c in df.columns for c in AGRUPACIONES_ANALISIS[n])]
+        if not disponibles:
+            return tablas
+        
+        medidas = _columnas_indicadoras(df)
+        for nombre in disponibles:
+            sumas = _sumas_por_grupo(df, AGRUPACIONES_ANALISIS[nombre], medidas)
+            tablas[nombre] = _formatear_analisis(nombre, sumas)
+        return tablas
+    
+    def get_analisis_ciudad(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Genera análisis de cumplimiento agrupado por ciudad."""
+        return self.get_analisis(df, ['ciudad'])['ciudad']
     
     def get_analisis_transportadora(self, df: pd.DataFrame) -> pd.DataFrame:
         """Genera análisis de desempeño por transportadora."""
-        if 'Transportadora' not in df.columns or len(df) == 0:
-            return pd.DataFrame()
-        
-        analisis = df.groupby('Transportadora').agg(
-            Total=('No_Orden', 'count'),
-            Cumplen=('Cumple_NNS', lambda x: (x == 'Cumple').sum()),
-            Desvio_Prom=('Desvio_Entrega', 'mean')
-        ).reset_index()
-        
-        analisis['Pct_Cumplimiento'] = (analisis['Cumplen'].astype(float) / analisis['Total'].astype(float) * 100).round(1).fillna(0)
-        analisis['Desvio_Prom'] = pd.to_numeric(analisis['Desvio_Prom'], errors='coerce').fillna(0).round(1)
-        analisis = analisis.sort_values('Total', ascending=False)
-        
-        return analisis
+        return self.get_analisis(df, ['transportadora'])['transportadora']
     
     def get_pedidos_incumplimiento(self, df: pd.DataFrame) -> pd.DataFrame:
         """Filtra y retorna solo los pedidos con incumplimiento."""
         if 'Cumple_NNS' not in df.columns or len(df) == 0:
             return pd.DataFrame()
         
-        inc = df[df['Cumple_NNS'] == 'No cumple'].copy()
-        return inc
+        return df[df['Cumple_NNS'] == 'No cumple']
     
     def get_analisis_mes(self, df: pd.DataFrame) -> pd.DataFrame:
         """Genera análisis de tendencia mensual."""
-        if 'Mes_Label' not in df.columns or 'Mes_Sort' not in df.columns or len(df) == 0:
-            return pd.DataFrame()
-        
-        analisis = df.groupby(['Mes_Sort', 'Mes_Label']).agg(
-            Total=('No_Orden', 'count'),
-            Cumplen=('Cumple_NNS', lambda x: (x == 'Cumple').sum())
-        ).reset_index()
-        
-        analisis['Pct_Cumplimiento'] = (analisis['Cumplen'].astype(float) / analisis['Total'].astype(float) * 100).round(1).fillna(0)
-        analisis = analisis.sort_values('Mes_Sort')
-        
-        return analisis
+        return self.get_analisis(df, ['mes'])['mes']
     
     def get_recomendaciones(self, df: pd.DataFrame) -> list:
         """Genera recomendaciones automáticas basadas en los datos."""
@@ -333,35 +651,545 @@ class DataProcessor:
         return recs
     
     def generate_mega_report(self, df_filtrado: pd.DataFrame, ind_filtrado: dict, ind_global: dict) -> io.BytesIO:
-        """Genera archivo Excel con múltiples hojas de análisis."""
-        buf = io.BytesIO()
-        
-        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-            resumen = pd.DataFrame({
-                'Métrica': ['Total Pedidos', 'Cumplimiento NNS', 'Desvío Promedio Entrega'],
-                'Valor Filtrado': [
-                    ind_filtrado['total_pedidos'],
-                    f"{ind_filtrado['pct_cumplimiento']}%",
-                    f"{ind_filtrado['promedio_desvio_entrega']} días"
-                ],
-                'Valor Global': [
-                    ind_global['total_pedidos'],
-                    f"{ind_global['pct_cumplimiento']}%",
-                    f"{ind_global['promedio_desvio_entrega']} días"
-                ]
-            })
-            resumen.to_excel(writer, sheet_name='Resumen', index=False)
-            df_filtrado.to_excel(writer, sheet_name='Datos', index=False)
-            
-            if 'Ciudad' in df_filtrado.columns:
-                ciudad_analysis = self.get_analisis_ciudad(df_filtrado)
-                if len(ciudad_analysis) > 0:
-                    ciudad_analysis.to_excel(writer, sheet_name='Por Ciudad', index=False)
-            
-            if 'Transportadora' in df_filtrado.columns:
-                transp_analysis = self.get_analisis_transportadora(df_filtrado)
-                if len(transp_analysis) > 0:
-                    transp_analysis.to_excel(writer, sheet_name='Por Transportadora', index=False)
+        """Genera archivo Excel con múltiples hojas de análisis (escritura en streaming)."""
+        resumen = pd.DataFrame({
+            'Métrica': ['Total Pedidos', 'Cumplimiento NNS', 'Desvío Promedio Entrega'],
+            'Valor Filtrado': [
+                ind_filtrado['total_pedidos'],
+                f"{ind_filtrado['pct_cumplimiento']}%",
+                f"{ind_filtrado['promedio_desvio_entrega']} días"
+            ],
+            'Valor Global': [
+                ind_global['total_pedidos'],
+                f"{ind_global['pct_cumplimiento']}%",
+                f"{ind_global['promedio_desvio_entrega']} días"
+            ]
+        })
+        hojas = {'Resumen': resumen, 'Datos': df_filtrado}
+        
+        if 'Ciudad' in df_filtrado.columns:
+            ciudad_analysis = self.get_analisis_ciudad(df_filtrado)
+            if len(ciudad_analysis) > 0:
+                hojas['Por Ciudad'] = ciudad_analysis
+        
+        if 'Transportadora' in df_filtrado.columns:
+            transp_analysis = self.get_analisis_transportadora(df_filtrado)
+            if len(transp_analysis) > 0:
+                hojas['Por Transportadora'] = transp_analysis
+        
+        return exportar_excel(hojas)
+
+
+class InstantaneaLimpieza:
+    """
+    Resultado de la limpieza de una versión de un libro: el DataFrame limpio y,
+    por cada fila limpia, la huella de contenido de la fila cruda que la originó.
+    
+    Sirve de base para limpiar la siguiente versión del mismo libro procesando
+    solo las filas nuevas o modificadas (DataProcessor.limpiar_incremental).
+    """
+    
+    def __init__(self, df_limpio: pd.DataFrame, huellas: np.ndarray = None,
+                 columnas: tuple = None):
+        """
+        Args:
+            df_limpio: DataFrame limpio (no se modifica)
+            huellas: Huella de la fila cruda de cada fila limpia (None = desconocidas)
+            columnas: Columnas del libro crudo con sus tipos
+        """
+        self.df_limpio = df_limpio
+        self.huellas = huellas
+        self.columnas = columnas
+    
+    def cambios_desde(self, anterior: 'InstantaneaLimpieza') -> dict:
+        """
+        Filas nuevas / modificadas / sin cambios frente a la instantánea de otra
+        versión del libro. Nuevas: pedido ausente en la anterior; modificadas:
+        pedido existente con otro contenido.
+        
+        Returns:
+            Dict con 'nuevas', 'modificadas' y 'sin_cambios', o None si alguna de las
+            dos no tiene huellas o cambiaron las columnas del libro (no comparables)
+        """
+        if (anterior is None or self.huellas is None or anterior.huellas is None
+                or self.columnas != anterior.columnas):
+            return None
+        
+        cambiadas = ~pd.Index(self.huellas).isin(anterior.huellas)
+        if 'No_Orden' in self.df_limpio.columns and 'No_Orden' in anterior.df_limpio.columns:
+            # isin recorre en Python el conjunto buscado: se busca el bloque pequeño en la instantánea
+            ordenes = self.df_limpio['No_Orden'][cambiadas]
+            previos = anterior.df_limpio['No_Orden']
+            previos = previos[previos.isin(ordenes)]
+            existia = ordenes.isin(previos).to_numpy()
+        else:
+            existia = np.zeros(int(cambiadas.sum()), dtype=bool)
+        return {
+            'nuevas': int((~existia).sum()),
+            'modificadas': int(existia.sum()),
+            'sin_cambios': int((~cambiadas).sum()),
+        }
+
+
+class MatrizSLA:
+    """
+    Matriz what-if de SLA: desvíos y cumplimiento para todas las combinaciones
+    almacén × principal × otras en una sola pasada vectorizada.
+
+    Los desvíos por fila se guardan como arreglos (filas × combinaciones), así
+    que aplicar una combinación es una consulta por índice en lugar de un
+    reproceso, y el resumen de sensibilidad sale de sumas por columna.
+    """
+    
+    def __init__(self, df_limpio: pd.DataFrame, rango_almacen=RANGO_SLA_ALMACEN,
+                 rango_principal=RANGO_SLA_PRINCIPAL, rango_otras=RANGO_SLA_OTRAS):
+        self.df_limpio = df_limpio
+        self.rango_almacen = list(rango_almacen)
+        self.rango_principal = list(rango_principal)
+        self.rango_otras = list(rango_otras)
+        n = len(df_limpio)
+        
+        self.es_principal = DataProcessor._es_ciudad_principal(df_limpio)
+        if 'Fecha_Entrega' in df_limpio.columns:
+            self.entregado = df_limpio['Fecha_Entrega'].notna().to_numpy()
+        else:
+            self.entregado = np.zeros(n, dtype=bool)
+        
+        # ── DESVÍO DE ENTREGA: (filas, principal, otras) ──────────────────────────────────────────────
+        if 'Dias_Entrega_Hab' in df_limpio.columns:
+            dias_e = df_limpio['Dias_Entrega_Hab'].to_numpy(dtype='float64')
+        else:
+            dias_e = np.zeros(n)
+        sla = np.where(
+            self.es_principal[:, None, None],
+            np.array(self.rango_principal)[None, :, None],
+            np.array(self.rango_otras)[None, None, :],
+        )
+        exceso = dias_e[:, None, None] - sla
+        self.desvio_entrega = np.where(
+            self.entregado[:, None, None] & (exceso > 0), exceso, 0.0
+        )
+        
+        # ── DESVÍO DE DESPACHO: (filas, almacén) ──────────────────────────────────────────────
+        if 'Dias_Despacho_Hab' in df_limpio.columns:
+            dias_d = df_limpio['Dias_Despacho_Hab'].clip(lower=0).to_numpy(dtype='float64')
+        else:
+            dias_d = np.zeros(n)
+        self.desvio_despacho = np.where(
+            dias_d[:, None] > np.array(self.rango_almacen)[None, :], dias_d[:, None], 0.0
+        )
+        
+        # ── VEREDICTOS DEL ARCHIVO: fijos para cualquier SLA ──────────────────────────────────────────────
+        if 'Cumple_NNS' in df_limpio.columns:
+            veredicto = df_limpio['Cumple_NNS']
+            self.cumple_fijo = (veredicto == 'Cumple').to_numpy() & self.entregado
+            self.evaluable = (~veredicto.isin(['Cumple', 'No cumple'])).to_numpy() & self.entregado
+        else:
+            self.cumple_fijo = np.zeros(n, dtype=bool)
+            self.evaluable = np.zeros(n, dtype=bool)
+    
+    def contiene(self, sla_almacen: int, sla_principal: int, sla_otras: int) -> bool:
+        return (sla_almacen in self.rango_almacen and sla_principal in self.rango_principal
+                and sla_otras in self.rango_otras)
+    
+    def aplicar(self, sla_almacen: int = 1, sla_principal: int = 3, sla_otras: int = 5) -> pd.DataFrame:
+        """Equivalente a DataProcessor.aplicar_sla, tomando los desvíos de la matriz."""
+        if not self.contiene(sla_almacen, sla_principal, sla_otras):
+            return DataProcessor.aplicar_sla(self.df_limpio, sla_almacen, sla_principal, sla_otras)
+        
+        ip = self.rango_principal.index(sla_principal)
+        io_ = self.rango_otras.index(sla_otras)
+        ia = self.rango_almacen.index(sla_almacen)
+        
+        df = self.df_limpio.copy(deep=False)
+        df['Desvio_Entrega'] = self.desvio_entrega[:, ip, io_]
+        df['Desvio_Despacho'] = self.desvio_despacho[:, ia]
+        df['SLA_Entrega'] = np.where(self.es_principal, sla_principal, sla_otras)
+        return DataProcessor.aplicar_esquema(DataProcessor._evaluar_cumplimiento(df))
+    
+    def resumen(self, posiciones: np.ndarray = None) -> pd.DataFrame:
+        """
+        Tabla de sensibilidad: una fila por combinación SLA con cumplimiento y desvíos.
+        
+        Args:
+            posiciones: Posiciones de fila (p. ej. de un filtro) a considerar; None = todas
+        """
+        sel = slice(None) if posiciones is None else posiciones
+        desvio_e = self.desvio_entrega[sel]
+        desvio_d = self.desvio_despacho[sel]
+        total = len(desvio_e)
+        
+        # Cumplen: veredicto fijo "Cumple" + evaluables sin desvío de entrega
+        cumplen = self.cumple_fijo[sel].sum() + (
+            (desvio_e <= 0) & self.evaluable[sel][:, None, None]
+        ).sum(axis=0)
+        con_e = (desvio_e > 0).sum(axis=0)
+        suma_e = desvio_e.sum(axis=0)
+        con_d = (desvio_d > 0).sum(axis=0)
+        suma_d = desvio_d.sum(axis=0)
         
-        buf.seek(0)
-        return buf
\ No newline at end of file
+        filas = []
+        for ia, a in enumerate(self.rango_almacen):
+            for ip, p in enumerate(self.rango_principal):
+                for io_, o in enumerate(self.rango_otras):
+                    filas.append({
+                        'SLA_Almacen': a, 'SLA_Principal': p, 'SLA_Otras': o,
+                        'Cumplen': int(cumplen[ip, io_]),
+                        'Pct_Cumplimiento': round(cumplen[ip, io_] / total * 100, 1) if total else 0.0,
+                        'Con_Desvio_Entrega': int(con_e[ip, io_]),
+                        'Prom_Desvio_Entrega': round(suma_e[ip, io_] / con_e[ip, io_], 1) if con_e[ip, io_] else 0.0,
+                        'Con_Desvio_Despacho': int(con_d[ia]),
+                        'Prom_Desvio_Despacho': round(suma_d[ia] / con_d[ia], 1) if con_d[ia] else 0.0,
+                    })
+        return pd.DataFrame(filas)
+
+
+class CuboCumplimiento:
+    """
+    Cubo de agregados de cumplimiento construido una vez sobre el DataFrame procesado.
+
+    Cada celda es una combinación de dimensiones (mes, transportadora, ciudad,
+    categoría, concepto, veredicto NNS y banderas de desvío) con sus medidas
+    (pedidos, sumas de desvíos y de Valor_num). Los KPIs y análisis por
+    ciudad/transportadora/mes se obtienen sumando celdas, en tiempo
+    proporcional al número de celdas y no al de pedidos.
+    """
+    
+    DIMENSIONES = [
+        'Mes_Sort', 'Mes_Label', 'Transportadora', 'Ciudad', 'Categoria', 'Concepto',
+        'Cumple_NNS', 'Con_Desvio_Despacho', 'Con_Desvio_Entrega',
+    ]
+    MEDIDAS = [
+        'Pedidos', 'Ordenes', 'Suma_Desvio_Despacho', 'Suma_Desvio_Entrega',
+        'Registros_Desvio_Entrega', 'Suma_Valor',
+    ]
+    
+    def __init__(self, df_procesado: pd.DataFrame = None, celdas: pd.DataFrame = None,
+                 dimensiones: list = None):
+        if celdas is not None:
+            self.celdas = celdas
+            self.dimensiones = dimensiones
+            return
+        
+        df = df_procesado
+        base = pd.DataFrame(index=df.index)
+        self.dimensiones = []
+        for dim in self.DIMENSIONES:
+            if dim in df.columns:
+                base[dim] = df[dim]
+                self.dimensiones.append(dim)
+        for columna, bandera in (('Desvio_Despacho', 'Con_Desvio_Despacho'),
+                                 ('Desvio_Entrega', 'Con_Desvio_Entrega')):
+            if columna in df.columns:
+                base[bandera] = df[columna] > 0
+                self.dimensiones.append(bandera)
+        
+        # Medidas por fila (las ausentes cuentan como 0)
+        cero = pd.Series(0.0, index=df.index)
+        base['Pedidos'] = 1
+        base['Ordenes'] = df['No_Orden'].notna().astype(int) if 'No_Orden' in df.columns else 1
+        base['Suma_Desvio_Despacho'] = df.get('Desvio_Despacho', cero).fillna(0)
+        base['Suma_Desvio_Entrega'] = df.get('Desvio_Entrega', cero).fillna(0)
+        base['Registros_Desvio_Entrega'] = df.get('Desvio_Entrega', cero).notna().astype(int)
+        base['Suma_Valor'] = df.get('Valor_num', cero).fillna(0)
+        
+        if not self.dimensiones:
+            self.celdas = base[self.MEDIDAS].sum().to_frame().T
+        else:
+            celdas = base.groupby(
+                self.dimensiones, dropna=False, sort=False, observed=True
+            )[self.MEDIDAS].sum().reset_index()
+            # Celdas con los valores de las dimensiones (no categorías): el cubo es pequeño
+            for dim in self.dimensiones:
+                if isinstance(celdas[dim].dtype, pd.CategoricalDtype):
+                    celdas[dim] = celdas[dim].astype(celdas[dim].cat.categories.dtype)
+            self.celdas = celdas
+    
+    @classmethod
+    def combinar(cls, cubos: list) -> 'CuboCumplimiento':
+        """
+        Une cubos de varios conjuntos (p. ej. un libro por cliente) sumando
+        las celdas con las mismas dimensiones. Solo se conservan las
+        dimensiones presentes en todos los cubos.
+        """
+        cubos = [c for c in cubos if c is not None]
+        if not cubos:
+            return cls(celdas=pd.DataFrame(columns=cls.MEDIDAS), dimensiones=[])
+        dimensiones = [d for d in cubos[0].dimensiones if all(c.tiene(d) for c in cubos[1:])]
+        celdas = pd.concat([c.celdas[dimensiones + cls.MEDIDAS] for c in cubos], ignore_index=True)
+        if dimensiones:
+            celdas = celdas.groupby(
+                dimensiones, dropna=False, sort=False, observed=True
+            )[cls.MEDIDAS].sum().reset_index()
+        else:
+            celdas = celdas[cls.MEDIDAS].sum().to_frame().T
+        return cls(celdas=celdas, dimensiones=dimensiones)
+    
+    def __len__(self) -> int:
+        return len(self.celdas)
+    
+    def tiene(self, dimension: str) -> bool:
+        return dimension in self.dimensiones
+    
+    def filtrar(self, selecciones: dict) -> 'CuboCumplimiento':
+        """
+        Sub-cubo con las celdas cuyas dimensiones están en las opciones elegidas
+        (comparadas como texto). Recibe la selección normalizada de
+        IndiceFiltros.clave: las dimensiones sin filtro no aparecen, y una
+        dimensión con tupla vacía (solo opciones que ya no existen) no
+        selecciona ninguna celda, igual que IndiceFiltros.mascara.
+        """
+        mascara = np.ones(len(self.celdas), dtype=bool)
+        for dim, elegidas in (selecciones or {}).items():
+            if elegidas is None:
+                continue
+            if dim in self.dimensiones:
+                mascara &= self.celdas[dim].astype(str).isin(list(elegidas)).to_numpy()
+            elif not elegidas:
+                mascara[:] = False
+        return CuboCumplimiento(celdas=self.celdas[mascara], dimensiones=self.dimensiones)
+    
+    def total(self, medida: str = 'Pedidos', mascara=None):
+        columna = self.celdas[medida]
+        return columna[mascara].sum() if mascara is not None else columna.sum()
+    
+    def _por_veredicto(self, veredicto: str):
+        if 'Cumple_NNS' not in self.dimensiones:
+            return 0
+        return int(self.total('Pedidos', self.celdas['Cumple_NNS'] == veredicto))
+    
+    def indicadores(self) -> dict:
+        """Mismos KPIs que DataProcessor.get_indicadores, sumando celdas."""
+        total_pedidos = int(self.total('Pedidos'))
+        if total_pedidos == 0:
+            return indicadores_vacios()
+        
+        cumplen = self._por_veredicto('Cumple')
+        no_cumplen = self._por_veredicto('No cumple')
+        pendientes = self._por_veredicto('PTE')
+        pct_cumplimiento = round((cumplen / total_pedidos * 100), 1) if 'Cumple_NNS' in self.dimensiones else 0.0
+        
+        ind = {
+            'total_pedidos': total_pedidos,
+            'pct_cumplimiento': pct_cumplimiento,
+            'cumplen_nns': cumplen,
+            'no_cumplen_nns': no_cumplen,
+        }
+        for tipo in ('despacho', 'entrega'):
+            bandera = f'Con_Desvio_{tipo.capitalize()}'
+            if bandera in self.dimensiones:
+                con_desvio = self.celdas[bandera].astype(bool)
+                cantidad = int(self.total('Pedidos', con_desvio))
+                suma = self.total(f'Suma_Desvio_{tipo.capitalize()}', con_desvio)
+                promedio = round(suma / cantidad, 1) if cantidad > 0 else 0.0
+            else:
+                cantidad, promedio = 0, 0.0
+            ind[f'con_desvio_{tipo}'] = cantidad
+            ind[f'promedio_desvio_{tipo}'] = promedio
+        
+        ind['pendientes'] = pendientes
+        # Mismo orden de claves que get_indicadores
+        return {k: ind[k] for k in indicadores_vacios()}
+    
+    def agrupar(self, dimensiones: list) -> pd.DataFrame:
+        """
+        Medidas sumadas por las dimensiones dadas, con Cumplen / No_Cumplen.
+        Las celdas con alguna dimensión vacía se excluyen (igual que groupby).
+        """
+        celdas = self.celdas
+        if 'Cumple_NNS' in self.dimensiones:
+            veredicto = celdas['Cumple_NNS']
+            celdas = celdas.assign(
+                Cumplen=celdas['Pedidos'].where(veredicto == 'Cumple', 0),
+                No_Cumplen=celdas['Pedidos'].where(veredicto == 'No cumple', 0),
+            )
+        else:
+            celdas = celdas.assign(Cumplen=0, No_Cumplen=0)
+        medidas = self.MEDIDAS + ['Cumplen', 'No_Cumplen']
+        return celdas.groupby(dimensiones, observed=True)[medidas].sum().reset_index()
+
+
+class AcumuladorCumplimiento:
+    """
+    KPIs y tablas de análisis de un conjunto procesado por bloques
+    (DataProcessor.procesar_en_bloques). Solo guarda agregados sumables: el
+    cubo de cumplimiento (KPIs y análisis por sus dimensiones) y, para los
+    conjuntos de análisis que el cubo no cubre (causal), las sumas por grupo.
+    La memoria depende de las combinaciones distintas, no del número de filas.
+    """
+    
+    def __init__(self):
+        self.cubo = None
+        self.sumas = {}  # Conjunto de análisis fuera del cubo → sumas por grupo
+        self.registros = 0
+    
+    def agregar(self, df_procesado: pd.DataFrame) -> 'AcumuladorCumplimiento':
+        """Suma un bloque procesado (aplicar_sla) a los agregados."""
+        parcial = AcumuladorCumplimiento()
+        parcial.cubo = CuboCumplimiento(df_procesado)
+        fuera = [
+            nombre for nombre, columnas in AGRUPACIONES_ANALISIS.items()
+            if not all(parcial.cubo.tiene(c) for c in columnas) and all(c in df_procesado.columns for c in columnas)
+        ]
+        if fuera:
+            medidas = _columnas_indicadoras(df_procesado)
+            for nombre in fuera:
+                parcial.sumas[nombre] = _sumas_por_grupo(df_procesado, AGRUPACIONES_ANALISIS[nombre], medidas)
+        parcial.registros = len(df_procesado)
+        combinado = AcumuladorCumplimiento.combinar([self, parcial])
+        self.cubo, self.sumas, self.registros = combinado.cubo, combinado.sumas, combinado.registros
+        return self
+    
+    @classmethod
+    def combinar(cls, acumuladores: list) -> 'AcumuladorCumplimiento':
+        """Une acumuladores de varios recorridos (p. ej. un archivo o un proceso por historia)."""
+        acumuladores = [a for a in acumuladores if a is not None and a.cubo is not None]
+        combinado = cls()
+        if not acumuladores:
+            return combinado
+        combinado.cubo = CuboCumplimiento.combinar([a.cubo for a in acumuladores])
+        combinado.registros = sum(a.registros for a in acumuladores)
+        for nombre in AGRUPACIONES_ANALISIS:
+            partes = [a.sumas[nombre] for a in acumuladores if nombre in a.sumas]
+            if len(partes) == 1:
+                combinado.sumas[nombre] = partes[0]
+            elif partes:
+                # Mismo orden de claves que _sumas_por_grupo (ordenadas, sin vacías)
+                combinado.sumas[nombre] = pd.concat(partes, ignore_index=True).groupby(
+                    AGRUPACIONES_ANALISIS[nombre], sort=True
+                ).sum().reset_index()
+        return combinado
+    
+    def __len__(self) -> int:
+        return self.registros
+    
+    def indicadores(self) -> dict:
+        """Mismos KPIs que DataProcessor.get_indicadores sobre el conjunto completo."""
+        if self.cubo is None:
+            return indicadores_vacios()
+        return self.cubo.indicadores()
+    
+    def analisis(self, agrupaciones: list = None) -> dict:
+        """Mismas tablas que DataProcessor.get_analisis sobre el conjunto completo."""
+        agrupaciones = list(agrupaciones or AGRUPACIONES_ANALISIS)
+        tablas = {nombre: pd.DataFrame() for nombre in agrupaciones}
+        for nombre in agrupaciones:
+            if nombre in self.sumas:
+                tablas[nombre] = _formatear_analisis(nombre, self.sumas[nombre])
+            elif self.cubo is not None and all(self.cubo.tiene(c) for c in AGRUPACIONES_ANALISIS[nombre]):
+                tablas[nombre] = _formatear_analisis(nombre, self.cubo.agrupar(AGRUPACIONES_ANALISIS[nombre]))
+        return tablas
+
+
+# ─────────────────────────────────────────────
+# Conjuntos de agrupación del análisis (DataProcessor.get_analisis)
+# ─────────────────────────────────────────────
+AGRUPACIONES_ANALISIS = {
+    'ciudad': ['Ciudad'],
+    'transportadora': ['Transportadora'],
+    'mes': ['Mes_Sort', 'Mes_Label'],
+    'categoria': ['Categoria'],
+    'causal': ['Causal_Incumplimiento'],
+}
+
+
+def _columnas_indicadoras(df: pd.DataFrame) -> dict:
+    """Medidas por fila como arreglos NumPy (mismos nombres que las medidas del cubo)."""
+    n = len(df)
+    if 'Cumple_NNS' in df.columns:
+        veredicto = df['Cumple_NNS'].to_numpy()
+        cumplen, no_cumplen = veredicto == 'Cumple', veredicto == 'No cumple'
+    else:
+        cumplen = no_cumplen = np.zeros(n, dtype=bool)
+    if 'Desvio_Entrega' in df.columns:
+        desvio = df['Desvio_Entrega'].to_numpy(dtype='float64', na_value=np.nan)
+    else:
+        desvio = np.full(n, np.nan)
+    valor = df['Valor_num'].to_numpy(dtype='float64', na_value=np.nan) if 'Valor_num' in df.columns else np.zeros(n)
+    ordenes = df['No_Orden'].notna().to_numpy() if 'No_Orden' in df.columns else np.ones(n, dtype=bool)
+    return {
+        'Ordenes': ordenes,
+        'Cumplen': cumplen,
+        'No_Cumplen': no_cumplen,
+        'Suma_Desvio_Entrega': np.nan_to_num(desvio),
+        'Registros_Desvio_Entrega': ~np.isnan(desvio),
+        'Suma_Valor': np.nan_to_num(valor),
+    }
+
+
+def _sumas_por_grupo(df: pd.DataFrame, columnas: list, medidas: dict) -> pd.DataFrame:
+    """
+    Equivalente a groupby(columnas).sum() sobre las medidas: claves ordenadas y
+    filas con alguna clave vacía excluidas, resuelto con factorize + bincount.
+    """
+    codigos = np.zeros(len(df), dtype='int64')
+    validos = np.ones(len(df), dtype=bool)
+    niveles = []
+    for columna in columnas:
+        # Columnas categóricas: se factorizan sus códigos, sin comparar textos
+        cod, valores = pd.factorize(df[columna], sort=True)
+        if isinstance(valores.dtype, pd.CategoricalDtype):
+            valores = pd.Index(np.asarray(valores), dtype=valores.categories.dtype)
+        validos &= cod >= 0
+        codigos = codigos * max(len(valores), 1) + cod
+        niveles.append(valores)
+    
+    # El espacio de códigos es pequeño (producto de cardinalidades): compactar con bincount
+    todos_validos = validos.all()
+    codigos = codigos if todos_validos else codigos[validos]
+    presentes = np.bincount(codigos, minlength=1) > 0
+    grupos = np.flatnonzero(presentes)
+    inversa = (np.cumsum(presentes) - 1)[codigos]
+    
+    sumas = {}
+    # Reconstruir las claves de cada grupo desde el código combinado
+    resto = grupos
+    for columna, valores in reversed(list(zip(columnas, niveles))):
+        tamano = max(len(valores), 1)
+        sumas[columna] = valores.take(resto % tamano)
+        resto = resto // tamano
+    sumas = {c: sumas[c] for c in columnas}
+    for nombre, arreglo in medidas.items():
+        pesos = arreglo if todos_validos else arreglo[validos]
+        suma = np.bincount(inversa, weights=pesos, minlength=len(grupos))
+        # Conteos (banderas bool) como enteros, igual que groupby().sum()
+        sumas[nombre] = suma.astype('int64') if arreglo.dtype == bool else suma
+    return pd.DataFrame(sumas)
+
+
+def _formatear_analisis(nombre: str, sumas: pd.DataFrame) -> pd.DataFrame:
+    """Convierte las sumas por grupo en la tabla de análisis correspondiente."""
+    columnas = AGRUPACIONES_ANALISIS[nombre]
+    sumas = sumas.rename(columns={'Ordenes': 'Total'})
+    pct = (sumas['Cumplen'].astype(float) / sumas['Total'].astype(float) * 100).round(1).fillna(0)
+    desvio_prom = pd.to_numeric(
+        sumas['Suma_Desvio_Entrega'] / sumas['Registros_Desvio_Entrega'], errors='coerce'
+    ).fillna(0).round(1)
+    
+    if nombre == 'ciudad':
+        analisis = sumas[columnas + ['Total', 'Cumplen', 'No_Cumplen']].assign(Pct_Cumplimiento=pct)
+        return analisis.sort_values('Total', ascending=False)
+    
+    if nombre == 'transportadora':
+        analisis = sumas[columnas + ['Total', 'Cumplen']].assign(Desvio_Prom=desvio_prom, Pct_Cumplimiento=pct)
+        return analisis.sort_values('Total', ascending=False)
+    
+    if nombre == 'mes':
+        analisis = sumas[columnas + ['Total', 'Cumplen']].assign(Pct_Cumplimiento=pct)
+        return analisis.sort_values('Mes_Sort')
+    
+    if nombre == 'categoria':
+        analisis = sumas[columnas].assign(
+            Pedidos=sumas['Total'], Cumplen=sumas['Cumplen'], Pct_Cumplimiento=pct,
+            Desvio_Prom=desvio_prom, Valor_Total=sumas['Suma_Valor'],
+        )
+        return analisis.sort_values('Pedidos', ascending=False)
+    
+    # causal: frecuencia de incumplimientos por causal registrada (sin causales vacías)
+    causal = sumas[columnas[0]].astype(str).str.strip()
+    analisis = pd.DataFrame({'Causal': causal, 'Frecuencia': sumas['No_Cumplen']})
+    analisis = analisis[(analisis['Causal'] != '') & (analisis['Frecuencia'] > 0)]
+    analisis = analisis.sort_values('Frecuencia', ascending=False, kind='stable').reset_index(drop=True)
+    analisis['Porcentaje'] = (analisis['Frecuencia'] / analisis['Frecuencia'].sum() * 100).round(1)
+    analisis['Porcentaje_Acum'] = analisis['Porcentaje'].cumsum()
+    return analisis
@@ -0,0 +1,275 @@
+"""
+EXPORTACIÓN EN STREAMING - TECU Aura
+Escritura de descargas por bloques de filas, con memoria acotada:
+
+- Excel (.xlsx): xlsxwriter en modo constant_memory; cada fila se vuelca a un
+  archivo temporal al pasar a la siguiente (openpyxl arma el modelo completo
+  del libro antes de guardarlo). Mismo resultado que DataFrame.to_excel:
+  fechas 'YYYY-MM-DD HH:MM:SS', vacíos como celdas en blanco, sin índice.
+- CSV comprimido (.csv.gz): to_csv por bloques sobre un flujo gzip.
+- Parquet (.parquet): un row group por bloque con pyarrow (opcional).
+"""
+
+import datetime
+import gzip
+import io
+import logging
+import math
+import numbers
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from cache_store import preparar_para_arrow
+
+logger = logging.getLogger(__name__)
+
+FILAS_POR_BLOQUE = 5_000  # Filas convertidas a objetos Python a la vez (Excel)
+FILAS_POR_BLOQUE_COLUMNAR = 100_000  # Filas por bloque de CSV / row group de Parquet
+FORMATO_FECHA_HORA = 'YYYY-MM-DD HH:MM:SS'
+FORMATO_FECHA = 'YYYY-MM-DD'
+FORMATO_FECHA_HORA_CSV = '%Y-%m-%d %H:%M:%S'
+EPOCA_EXCEL = np.datetime64('1899-12-30', 'D')  # Serial 0 (válido desde 1900-03-01)
+
+# Encabezado de los reportes del dashboard: fondo índigo, texto blanco, negrita, centrado
+ESTILO_ENCABEZADO = {'bold': True, 'font_color': '#FFFFFF', 'bg_color': '#4F46E5', 'align': 'center'}
+
+# Nombres de columna para mostrar y descargar tablas de pedidos
+COLUMNAS_DISPLAY = {
+    'Fecha': 'Fecha Compra', 'No_Orden': 'No. Orden',
+    'Cliente': 'Cliente', 'Producto': 'Producto',
+    'Ciudad': 'Ciudad', 'Transportadora': 'Transportadora',
+    'No_Guia': 'No. Guía', 'Fecha_Despacho': 'F. Despacho',
+    'Fecha_Entrega': 'F. Entrega',
+    'Dias_Despacho_Hab': 'Días Despacho', 'Dias_Entrega_Hab': 'Días Entrega',
+    'SLA_Entrega': 'SLA', 'Desvio_Despacho': 'Desvío Despacho',
+    'Desvio_Entrega': 'Desvío Entrega', 'Area_Incumple': 'Área Responsable',
+    'Valor_despacho': 'Valor Despacho', 'Causal_Incumplimiento': 'Causal',
+    'Categoria': 'Categoría', 'Concepto': 'Tipo'
+}
+
+# Formatos de descarga: extensión → etiqueta y tipo MIME
+FORMATOS_EXPORTACION = {
+    'xlsx': {
+        'etiqueta': 'Excel (.xlsx)',
+        'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    },
+    'csv.gz': {'etiqueta': 'CSV comprimido (.csv.gz)', 'mime': 'application/gzip'},
+    'parquet': {'etiqueta': 'Parquet (.parquet)', 'mime': 'application/vnd.apache.parquet'},
+}
+
+
+class LibroExcelStreaming:
+    """
+    Libro .xlsx de escritura secuencial: cada hoja se escribe completa antes
+    de agregar la siguiente.
+
+    Uso:
+        with LibroExcelStreaming(estilo_encabezado=ESTILO_ENCABEZADO) as libro:
+            libro.agregar_hoja('Datos', df)
+        buf = libro.destino
+    """
+
+    def __init__(self, destino=None, estilo_encabezado: dict = None, filas_por_bloque: int = FILAS_POR_BLOQUE):
+        """
+        Args:
+            destino: Ruta o archivo binario de salida (None = BytesIO nuevo)
+            estilo_encabezado: Formato xlsxwriter para la fila 1 (None = sin formato)
+            filas_por_bloque: Filas del DataFrame convertidas en cada paso
+        """
+        self.destino = io.BytesIO() if destino is None else destino
+        self.filas_por_bloque = filas_por_bloque
+        self._libro = xlsxwriter.Workbook(self.destino, {
+            'constant_memory': True,
+            'nan_inf_to_errors': True,
+            'remove_timezone': True,
+        })
+        self._formato_encabezado = self._libro.add_format(estilo_encabezado) if estilo_encabezado else None
+        self._formato_fecha_hora = self._libro.add_format({'num_format': FORMATO_FECHA_HORA})
+        self._formato_fecha = self._libro.add_format({'num_format': FORMATO_FECHA})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+        return False
+
+    def cerrar(self):
+        """Cierra el libro (escribe el .xlsx) y retorna el destino listo para leer."""
+        self._libro.close()
+        if isinstance(self.destino, io.BytesIO):
+            self.destino.seek(0)
+        return self.destino
+
+    def agregar_hoja(self, nombre: str, df: pd.DataFrame) -> None:
+        """Escribe el DataFrame completo (encabezado + filas) en una hoja nueva."""
+        hoja = self._libro.add_worksheet(nombre)
+        for col, titulo in enumerate(df.columns):
+            hoja.write_string(0, col, str(titulo), self._formato_encabezado)
+
+        for inicio in range(0, len(df), self.filas_por_bloque):
+            bloque = df.iloc[inicio:inicio + self.filas_por_bloque]
+            columnas = [self._preparar_columna(hoja, bloque.iloc[:, j]) for j in range(bloque.shape[1])]
+            # constant_memory exige escribir fila por fila, en orden
+            for i in range(len(bloque)):
+                fila = inicio + i + 1
+                for col, (escribir, valores) in enumerate(columnas):
+                    valor = valores[i]
+                    if valor is not None:
+                        escribir(fila, col, valor)
+
+    def _preparar_columna(self, hoja, serie: pd.Series) -> tuple:
+        """(función de escritura, valores del bloque con None para vacíos) según el dtype."""
+        tipo = serie.dtype
+        if isinstance(tipo, pd.DatetimeTZDtype):
+            serie = serie.dt.tz_localize(None)
+            tipo = serie.dtype
+
+        if pd.api.types.is_bool_dtype(tipo):
+            return hoja.write_boolean, serie.to_numpy(dtype=object, na_value=None).tolist()
+
+        if pd.api.types.is_datetime64_dtype(tipo):
+            # Serial de Excel calculado en bloque: mismo valor que write_datetime
+            dias = (serie.to_numpy() - EPOCA_EXCEL) / np.timedelta64(1, 'D')
+            valores = dias.astype(object)
+            valores[serie.isna().to_numpy()] = None
+            formato = self._formato_fecha_hora
+            return (lambda fila, col, v: hoja.write_number(fila, col, v, formato)), valores.tolist()
+
+        if pd.api.types.is_numeric_dtype(tipo):
+            return hoja.write_number, serie.to_numpy(dtype=object, na_value=None).tolist()
+
+        # Texto, categorías y columnas mixtas: se decide valor por valor
+        def escribir(fila, col, v):
+            self._escribir_valor(hoja, fila, col, v)
+        return escribir, serie.to_numpy(dtype=object, na_value=None).tolist()
+
+    def _escribir_valor(self, hoja, fila: int, col: int, valor) -> None:
+        if isinstance(valor, str):
+            hoja.write_string(fila, col, valor)
+        elif isinstance(valor, (bool, np.bool_)):
+            hoja.write_boolean(fila, col, bool(valor))
+        elif isinstance(valor, numbers.Real):
+            if not math.isnan(valor):
+                hoja.write_number(fila, col, float(valor))
+        elif isinstance(valor, datetime.datetime):
+            hoja.write_datetime(fila, col, valor, self._formato_fecha_hora)
+        elif isinstance(valor, datetime.date):
+            hoja.write_datetime(fila, col, valor, self._formato_fecha)
+        else:
+            hoja.write_string(fila, col, str(valor))
+
+
+def exportar_excel(hojas: dict, estilo_encabezado: dict = None, destino=None):
+    """
+    Escribe varias hojas en un .xlsx con memoria acotada.
+
+    Args:
+        hojas: {nombre de hoja: DataFrame}, en el orden de las pestañas
+        estilo_encabezado: Formato de la fila de encabezado (p. ej. ESTILO_ENCABEZADO)
+        destino: Ruta o archivo binario de salida (None = BytesIO nuevo)
+
+    Returns:
+        El destino; si es BytesIO, posicionado al inicio
+    """
+    with LibroExcelStreaming(destino, estilo_encabezado) as libro:
+        for nombre, df in hojas.items():
+            libro.agregar_hoja(nombre, df)
+    return libro.destino
+
+
+def parquet_disponible() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def formatos_disponibles() -> list:
+    """Extensiones de FORMATOS_EXPORTACION utilizables (Parquet requiere pyarrow)."""
+    return [f for f in FORMATOS_EXPORTACION if f != 'parquet' or parquet_disponible()]
+
+
+def renombrar_display(df: pd.DataFrame) -> pd.DataFrame:
+    """Aplica COLUMNAS_DISPLAY (las columnas ausentes se ignoran)."""
+    return df.rename(columns=COLUMNAS_DISPLAY)
+
+
+def exportar_csv_gzip(df: pd.DataFrame, destino=None, filas_por_bloque: int = FILAS_POR_BLOQUE_COLUMNAR):
+    """
+    Escribe el DataFrame como CSV UTF-8 comprimido con gzip, bloque a bloque.
+
+    Args:
+        df: Datos a exportar (sin índice)
+        destino: Ruta o archivo binario de salida (None = BytesIO nuevo)
+
+    Returns:
+        El destino; si es BytesIO, posicionado al inicio
+    """
+    destino = io.BytesIO() if destino is None else destino
+    if isinstance(destino, (str, bytes)) or hasattr(destino, '__fspath__'):
+        comprimido = gzip.GzipFile(destino, mode='wb', compresslevel=6, mtime=0)
+    else:
+        comprimido = gzip.GzipFile(fileobj=destino, mode='wb', compresslevel=6, mtime=0)
+    with io.TextIOWrapper(comprimido, encoding='utf-8', newline='') as texto:
+        # Al menos un bloque: un DataFrame vacío igual produce la fila de encabezado.
+        # Formato de fecha fijo: pandas omite la hora en bloques donde todas son 00:00
+        for inicio in range(0, max(len(df), 1), filas_por_bloque):
+            df.iloc[inicio:inicio + filas_por_bloque].to_csv(
+                texto, index=False, header=inicio == 0, date_format=FORMATO_FECHA_HORA_CSV
+            )
+    if isinstance(destino, io.BytesIO):
+        destino.seek(0)
+    return destino
+
+
+def exportar_parquet(df: pd.DataFrame, destino=None, filas_por_bloque: int = FILAS_POR_BLOQUE_COLUMNAR):
+    """
+    Escribe el DataFrame como Parquet, un row group por bloque de filas.
+
+    El esquema se fija una vez para todo el archivo; las columnas object con
+    tipos mezclados se guardan como texto (ver cache_store.preparar_para_arrow).
+
+    Returns:
+        El destino; si es BytesIO, posicionado al inicio
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    destino = io.BytesIO() if destino is None else destino
+    df = preparar_para_arrow(df)
+    esquema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(destino, esquema, compression='snappy') as escritor:
+        for inicio in range(0, len(df), filas_por_bloque):
+            bloque = df.iloc[inicio:inicio + filas_por_bloque]
+            escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False))
+    if isinstance(destino, io.BytesIO):
+        destino.seek(0)
+    return destino
+
+
+def exportar_tabla(df: pd.DataFrame, formato: str, hoja: str = 'Datos', renombrar: bool = True):
+    """
+    Exporta una tabla de pedidos en el formato pedido.
+
+    Args:
+        df: Datos a exportar
+        formato: Clave de FORMATOS_EXPORTACION ('xlsx', 'csv.gz' o 'parquet')
+        hoja: Nombre de la hoja (solo Excel)
+        renombrar: Aplicar COLUMNAS_DISPLAY, igual que la tabla en pantalla
+
+    Returns:
+        BytesIO con el archivo, posicionado al inicio
+    """
+    if renombrar:
+        df = renombrar_display(df)
+    if formato == 'xlsx':
+        return exportar_excel({hoja: df})
+    if formato == 'csv.gz':
+        return exportar_csv_gzip(df)
+    if formato == 'parquet':
+        return exportar_parquet(df)
+    raise ValueError(f"Formato de exportación no soportado: {formato}")
@@ -0,0 +1,144 @@
+"""
+ÍNDICE DE FILTROS DEL SIDEBAR - TECU Aura
+Índice categórico construido una vez por dataset: cada dimensión filtrable se
+codifica como diccionario (pd.factorize) y guarda una máscara de filas por
+valor, empaquetada en bits (np.packbits). Los filtros se combinan como
+uniones (OR dentro de una dimensión) e intersecciones (AND entre dimensiones)
+de bitmaps y el DataFrame filtrado se materializa una sola vez al final.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# ─────────────────────────────────────────────
+# Dimensiones filtrables: columna → columna de orden de las opciones (None = alfabético)
+# ─────────────────────────────────────────────
+DIMENSIONES_FILTRO = {
+    'Mes_Label': 'Mes_Sort',
+    'Transportadora': None,
+    'Ciudad': None,
+    'Categoria': None,
+    'Concepto': None,
+}
+COLUMNA_VALOR = 'Valor_num'
+
+
+class IndiceFiltros:
+    """
+    Índice de filtros del sidebar sobre un DataFrame limpio o procesado.
+
+    Las posiciones de fila del índice coinciden con las del DataFrame usado
+    para construirlo; como las etapas SLA conservan filas y orden, el mismo
+    índice sirve para cualquier combinación de SLA del mismo archivo.
+    """
+
+    def __init__(self, df: pd.DataFrame, dimensiones: dict = None):
+        self.n_filas = len(df)
+        self.bitmaps = {}   # columna → {opción: bitmap empaquetado}
+        self.opciones = {}  # columna → lista de opciones ordenadas
+
+        for columna, orden in (dimensiones or DIMENSIONES_FILTRO).items():
+            if columna in df.columns:
+                self._indexar(df, columna, orden)
+
+        # Rango de valor: mismos datos que el slider (vacíos cuentan como 0)
+        if COLUMNA_VALOR in df.columns:
+            self.valores = df[COLUMNA_VALOR].fillna(0).to_numpy(dtype='float64')
+        else:
+            self.valores = None
+
+    def _indexar(self, df: pd.DataFrame, columna: str, orden: str) -> None:
+        codigos, unicos = pd.factorize(df[columna])
+        # Las opciones se comparan como texto (valores crudos distintos pueden coincidir)
+        etiquetas = [str(u) for u in unicos]
+
+        bitmaps = {}
+        for codigo, etiqueta in enumerate(etiquetas):
+            bits = np.packbits(codigos == codigo)
+            bitmaps[etiqueta] = bits if etiqueta not in bitmaps else bitmaps[etiqueta] | bits
+        self.bitmaps[columna] = bitmaps
+
+        if orden is not None and orden in df.columns:
+            # Orden cronológico: primer valor de la columna de orden por opción
+            claves = pd.Series(df[orden].to_numpy()).groupby(codigos).min().dropna()
+            claves = claves[claves.index >= 0]
+            vistos = dict.fromkeys(etiquetas[c] for c in claves.sort_values(kind='stable').index)
+            self.opciones[columna] = list(vistos)
+        else:
+            self.opciones[columna] = sorted(bitmaps)
+
+    def tiene(self, columna: str) -> bool:
+        return columna in self.bitmaps
+
+    def opciones_de(self, columna: str) -> list:
+        """Opciones ordenadas de una dimensión (vacía si la columna no existe)."""
+        return self.opciones.get(columna, [])
+
+    def rango_valor(self) -> tuple:
+        """(mínimo, máximo) de la columna de valor, o None si no existe."""
+        if self.valores is None or self.n_filas == 0:
+            return None
+        return float(self.valores.min()), float(self.valores.max())
+
+    def mascara(self, selecciones: dict = None, rango_valor: tuple = None) -> np.ndarray:
+        """
+        Combina los filtros en una máscara booleana por fila.
+
+        Args:
+            selecciones: {columna: opciones elegidas}; vacío/None = sin filtro en esa dimensión
+            rango_valor: (mínimo, máximo) inclusivo sobre la columna de valor, o None
+
+        Returns:
+            Arreglo bool de longitud n_filas
+        """
+        resultado = None
+        for columna, elegidas in (selecciones or {}).items():
+            if not elegidas or columna not in self.bitmaps:
+                continue
+            bitmaps = self.bitmaps[columna]
+            union = np.zeros((self.n_filas + 7) // 8, dtype=np.uint8)
+            for opcion in elegidas:
+                if opcion in bitmaps:
+                    union |= bitmaps[opcion]
+            resultado = union if resultado is None else resultado & union
+
+        if resultado is None:
+            mascara = np.ones(self.n_filas, dtype=bool)
+        else:
+            mascara = np.unpackbits(resultado, count=self.n_filas).astype(bool)
+
+        if rango_valor is not None and self.valores is not None:
+            mascara &= (self.valores >= rango_valor[0]) & (self.valores <= rango_valor[1])
+        return mascara
+
+    def clave(self, selecciones: dict = None, rango_valor: tuple = None) -> tuple:
+        """
+        Selección normalizada y hashable, para usar como clave de caché.
+
+        Dimensiones sin filtro, opciones desconocidas y un rango de valor que
+        cubre todo el dataset se omiten: selecciones equivalentes comparten
+        clave y "sin filtros" es siempre la tupla vacía.
+        """
+        partes = []
+        for columna, elegidas in sorted((selecciones or {}).items()):
+            conocidas = sorted(set(elegidas or ()) & self.bitmaps.get(columna, {}).keys())
+            if elegidas and columna in self.bitmaps:
+                partes.append((columna, tuple(conocidas)))
+        limites = self.rango_valor()
+        if rango_valor is not None and limites is not None and (
+            rango_valor[0] > limites[0] or rango_valor[1] < limites[1]
+        ):
+            partes.append((COLUMNA_VALOR, (float(rango_valor[0]), float(rango_valor[1]))))
+        return tuple(partes)
+
+    def filas(self, selecciones: dict = None, rango_valor: tuple = None) -> np.ndarray:
+        """Posiciones de las filas que cumplen los filtros."""
+        return np.flatnonzero(self.mascara(selecciones, rango_valor))
+
+    def filtrar(self, df: pd.DataFrame, selecciones: dict = None, rango_valor: tuple = None) -> pd.DataFrame:
+        """Materializa el DataFrame filtrado una sola vez (sin copia si no hay filtros activos)."""
+        mascara = self.mascara(selecciones, rango_valor)
+        if mascara.all():
+            return df
+        return df[mascara]
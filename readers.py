@@ -0,0 +1,402 @@
+"""
+MÓDULO DE LECTURA DE LIBROS - TECU Aura
+Carga el archivo de seguimiento abriéndolo una sola vez: selección de hoja,
+detección de la fila de encabezado y construcción del DataFrame sobre el
+mismo flujo de filas. El motor de lectura se elige automáticamente entre
+los instalados (calamine → openpyxl → pandas); las exportaciones CSV se leen
+por bloques con el parser C de pandas.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+import codecs
+import io
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────
+# Reglas de detección
+# ─────────────────────────────────────────────
+PALABRAS_HOJA = ['venta', 'base', 'despacho']
+PALABRAS_ENCABEZADO = ['fecha', 'cliente', 'ciudad', 'no orden']
+FILAS_DETECCION_ENCABEZADO = 10
+
+# CSV: separadores candidatos, codificaciones probadas en orden y errores de Excel exportados como texto
+SEPARADORES_CSV = [',', ';', '\t', '|']
+CODIFICACIONES_CSV = ['utf-8-sig', 'cp1252', 'latin-1']
+ERRORES_EXCEL = ['#N/D', '#N/A', '#¡VALOR!', '#VALUE!', '#¡DIV/0!', '#DIV/0!', '#¡REF!', '#REF!',
+                 '#¿NOMBRE?', '#NAME?', '#¡NUM!', '#NUM!', '#¡NULO!', '#NULL!']
+HOJA_CSV = 'CSV'
+TAMANO_FRAGMENTO_CSV = 1 << 20  # Bytes por fragmento al detectar codificación y encabezado
+
+
+def seleccionar_hoja(nombres_hojas: list) -> str:
+    """Retorna la primera hoja cuyo nombre sugiere datos de ventas/despachos, o la primera hoja."""
+    for h in nombres_hojas:
+        if any(kw in h.lower() for kw in PALABRAS_HOJA):
+            logger.info(f"Hoja detectada: {h}")
+            return h
+    hoja = nombres_hojas[0]  # Fallback: usar primera hoja
+    logger.warning(f"Usando hoja por defecto: {hoja}")
+    return hoja
+
+
+def es_fila_encabezado(fila: list) -> bool:
+    """True si la fila contiene alguna palabra clave de encabezado."""
+    row_vals = ' '.join(str(v).lower() for v in fila)
+    return any(kw in row_vals for kw in PALABRAS_ENCABEZADO)
+
+
+def _construir_dataframe(filas: list, header_row: int) -> pd.DataFrame:
+    """Construye el DataFrame con el mismo parser que usa pandas.read_excel."""
+    # Quitar filas vacías al final y completar filas cortas hasta el ancho máximo
+    ultima = max((i for i, f in enumerate(filas) if f), default=-1)
+    filas = filas[: ultima + 1]
+    if not filas:
+        return pd.DataFrame()
+    ancho = max(len(f) for f in filas)
+    filas = [f + [''] * (ancho - len(f)) for f in filas]
+
+    try:
+        return TextParser(filas, header=header_row, skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+
+def _leer_flujo(filas_iter) -> pd.DataFrame:
+    """
+    Consume un flujo de filas ya convertidas: recorta celdas vacías al final,
+    detecta el encabezado entre las primeras FILAS_DETECCION_ENCABEZADO filas
+    y construye el DataFrame sin releer el origen.
+    """
+    filas = []
+    header_row = None
+    for i, fila in enumerate(filas_iter):
+        fila = list(fila)
+        while fila and fila[-1] == '':
+            fila.pop()
+        filas.append(fila)
+        if header_row is None and i < FILAS_DETECCION_ENCABEZADO and es_fila_encabezado(fila):
+            header_row = i
+            logger.info(f"Fila de encabezado detectada: {header_row}")
+    return _construir_dataframe(filas, header_row or 0)
+
+
+# ─────────────────────────────────────────────
+# Motores de lectura
+# ─────────────────────────────────────────────
+class LectorLibro(ABC):
+    """
+    Motor de lectura de hojas de cálculo.
+
+    Cada motor abre el archivo una sola vez y entrega las filas de la hoja
+    seleccionada convertidas con las mismas reglas que pandas.read_excel,
+    de modo que el DataFrame resultante no depende del motor usado.
+    """
+
+    nombre = ''
+    extensiones = ()
+    modulo = None  # Módulo opcional que debe estar instalado
+
+    @classmethod
+    def disponible(cls) -> bool:
+        if cls.modulo is None:
+            return True
+        try:
+            __import__(cls.modulo)
+            return True
+        except ImportError:
+            return False
+
+    @abstractmethod
+    def leer(self, archivo_bytes: bytes) -> tuple:
+        """Retorna (DataFrame crudo, nombre de hoja usada)."""
+
+
+class LectorCalamine(LectorLibro):
+    """Lector en Rust (python-calamine): el más rápido para xlsx/xls/xlsb/ods."""
+
+    nombre = 'calamine'
+    extensiones = ('.xlsx', '.xlsm', '.xls', '.xlsb', '.ods')
+    modulo = 'python_calamine'
+
+    @staticmethod
+    def _convertir_celda(value):
+        """Flotantes enteros → int y date → datetime (reglas de pandas para calamine)."""
+        if isinstance(value, float):
+            val = int(value)
+            return val if val == value else value
+        if isinstance(value, date) and not isinstance(value, datetime):
+            return datetime(value.year, value.month, value.day)
+        return value
+
+    def leer(self, archivo_bytes: bytes) -> tuple:
+        from python_calamine import CalamineWorkbook
+
+        wb = CalamineWorkbook.from_filelike(io.BytesIO(archivo_bytes))
+        try:
+            hoja = seleccionar_hoja(wb.sheet_names)
+            filas = wb.get_sheet_by_name(hoja).to_python(skip_empty_area=False)
+            df = _leer_flujo([self._convertir_celda(c) for c in fila] for fila in filas)
+        finally:
+            wb.close()
+        return df, hoja
+
+
+class LectorOpenpyxl(LectorLibro):
+    """Lector por defecto para xlsx: openpyxl en modo solo lectura, fila a fila."""
+
+    nombre = 'openpyxl'
+    extensiones = ('.xlsx', '.xlsm')
+    modulo = 'openpyxl'
+
+    @staticmethod
+    def _convertir_celda(cell):
+        """Vacías → '', errores → NaN, numéricos enteros → int."""
+        from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+        if cell.value is None:
+            return ''
+        if cell.data_type == TYPE_ERROR:
+            return np.nan
+        if cell.data_type == TYPE_NUMERIC:
+            val = int(cell.value)
+            return val if val == cell.value else float(cell.value)
+        return cell.value
+
+    def leer(self, archivo_bytes: bytes) -> tuple:
+        from openpyxl import load_workbook
+
+        wb = load_workbook(io.BytesIO(archivo_bytes), read_only=True, data_only=True, keep_links=False)
+        try:
+            hoja = seleccionar_hoja(wb.sheetnames)
+            ws = wb[hoja]
+            ws.reset_dimensions()
+            df = _leer_flujo([self._convertir_celda(c) for c in row] for row in ws.rows)
+        finally:
+            wb.close()
+        return df, hoja
+
+
+class LectorPandas(LectorLibro):
+    """Último recurso (p. ej. .xls con xlrd): un solo pd.ExcelFile para ambas lecturas."""
+
+    nombre = 'pandas'
+    extensiones = ('.xls', '.xlsx', '.xlsm', '.xlsb', '.ods')
+
+    def leer(self, archivo_bytes: bytes) -> tuple:
+        with pd.ExcelFile(io.BytesIO(archivo_bytes)) as xl:
+            hoja = seleccionar_hoja(xl.sheet_names)
+            df_raw = xl.parse(hoja, header=None, nrows=FILAS_DETECCION_ENCABEZADO)
+            header_row = 0
+            for i in range(len(df_raw)):
+                if es_fila_encabezado(df_raw.iloc[i].values):
+                    header_row = i
+                    logger.info(f"Fila de encabezado detectada: {header_row}")
+                    break
+            df = xl.parse(hoja, header=header_row)
+        return df, hoja
+
+
+class LectorCSV(LectorLibro):
+    """
+    Exportaciones CSV del libro: parser C de pandas por bloques sobre los bytes
+    (sin decodificar el archivo completo a texto). El encabezado se detecta con
+    las mismas reglas que en las hojas de cálculo, saltando las filas previas
+    (p. ej. filas con solo comas).
+    """
+
+    nombre = 'csv'
+    extensiones = ('.csv',)
+    filas_bloque = 100_000
+
+    @staticmethod
+    def _detectar_encabezado(cabecera: bytes, codificacion: str) -> tuple:
+        """Fila de encabezado y separador, sobre las primeras FILAS_DETECCION_ENCABEZADO líneas."""
+        lineas = cabecera.decode(codificacion, errors='ignore').splitlines()
+        header_row = 0
+        for i, linea in enumerate(lineas[:FILAS_DETECCION_ENCABEZADO]):
+            if es_fila_encabezado([linea]):
+                header_row = i
+                logger.info(f"Fila de encabezado detectada: {header_row}")
+                break
+        encabezado = lineas[header_row] if lineas else ''
+        separador = max(SEPARADORES_CSV, key=encabezado.count)
+        return header_row, separador
+
+    @staticmethod
+    def detectar_codificacion(fragmentos) -> str:
+        """
+        Primera codificación de CODIFICACIONES_CSV que decodifica todo el
+        contenido, recorrido por fragmentos (sin armar el texto completo).
+
+        Args:
+            fragmentos: Función sin argumentos que retorna un iterador de bytes
+        """
+        for codificacion in CODIFICACIONES_CSV[:-1]:
+            decodificador = codecs.getincrementaldecoder(codificacion)()
+            try:
+                for fragmento in fragmentos():
+                    decodificador.decode(fragmento)
+                decodificador.decode(b'', final=True)
+                return codificacion
+            except UnicodeDecodeError:
+                logger.info(f"CSV no es {codificacion}; probando la siguiente codificación")
+        return CODIFICACIONES_CSV[-1]  # latin-1 decodifica cualquier byte
+
+    @classmethod
+    def opciones(cls, cabecera: bytes, codificacion: str) -> dict:
+        """Argumentos de pd.read_csv para el archivo: encabezado, separador y todo como texto."""
+        header_row, separador = cls._detectar_encabezado(cabecera, codificacion)
+        return {
+            'sep': separador, 'skiprows': header_row, 'encoding': codificacion,
+            'dtype': str, 'na_values': ERRORES_EXCEL, 'engine': 'c',
+        }
+
+    @staticmethod
+    def inferir_tipos(df: pd.DataFrame) -> pd.DataFrame:
+        """Columnas totalmente numéricas → int/float, como las entrega el parser de Excel."""
+        for col in df.columns:
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass
+        return df
+
+    @staticmethod
+    def tipos_numericos(bloques) -> dict:
+        """
+        Tipo de cada columna numérica en todos los bloques (texto) de un CSV: el
+        mismo que daría inferir_tipos sobre la columna completa (int64 + float64
+        o un bloque con vacíos → float64; una celda no numérica → queda texto).
+        """
+        tipos = None
+        for bloque in bloques:
+            if tipos is None:
+                tipos = dict.fromkeys(bloque.columns)
+            for col in list(tipos):
+                try:
+                    tipo = pd.to_numeric(bloque[col]).dtype
+                except (ValueError, TypeError):
+                    del tipos[col]
+                    continue
+                tipos[col] = tipo if tipos[col] is None else np.result_type(tipos[col], tipo)
+        return tipos or {}
+
+    def leer(self, archivo_bytes: bytes) -> tuple:
+        vista = memoryview(archivo_bytes)
+        codificacion = self.detectar_codificacion(
+            lambda: (vista[i:i + TAMANO_FRAGMENTO_CSV] for i in range(0, len(vista), TAMANO_FRAGMENTO_CSV))
+        )
+        bloques = pd.read_csv(
+            io.BytesIO(archivo_bytes), chunksize=self.filas_bloque,
+            **self.opciones(archivo_bytes[:TAMANO_FRAGMENTO_CSV], codificacion),
+        )
+        # Todo como texto por bloque: la inferencia de tipos se hace una vez sobre la columna
+        # completa (un bloque no puede decidir int y otro texto para la misma columna)
+        df = self.inferir_tipos(pd.concat(bloques, ignore_index=True))
+        # Sin filas vacías al final, como _construir_dataframe con las hojas
+        llenas = np.flatnonzero(df.notna().any(axis=1).to_numpy())
+        return df.iloc[: llenas[-1] + 1 if len(llenas) else 0], HOJA_CSV
+
+
+# Orden de preferencia: del más rápido al más compatible
+LECTORES = [LectorCalamine, LectorOpenpyxl, LectorPandas, LectorCSV]
+
+
+def _extension(nombre_archivo: str, archivo_bytes: bytes) -> str:
+    ext = os.path.splitext(nombre_archivo or '')[1].lower()
+    if ext:
+        return ext
+    # Sin nombre: los libros OOXML son archivos zip
+    return '.xlsx' if archivo_bytes.startswith(b'PK') else '.xls'
+
+
+def extensiones_soportadas() -> list:
+    """Extensiones de archivo que algún motor instalado puede leer."""
+    return sorted({ext for l in LECTORES if l.disponible() for ext in l.extensiones})
+
+
+def lectores_para(nombre_archivo: str, archivo_bytes: bytes = b'') -> list:
+    """Motores instalados que soportan el tipo de archivo, en orden de preferencia."""
+    ext = _extension(nombre_archivo, archivo_bytes)
+    return [l for l in LECTORES if ext in l.extensiones and l.disponible()]
+
+
+def cargar_libro(archivo_bytes: bytes, nombre_archivo: str = '', motor: str = None) -> tuple:
+    """
+    Lee la hoja de datos del libro con el motor más rápido disponible.
+
+    Abre el archivo una sola vez, detecta la hoja y la fila de encabezado
+    sobre el mismo flujo de filas y construye el DataFrame. Si el motor
+    preferido falla se reintenta con el siguiente (openpyxl como respaldo).
+
+    Args:
+        archivo_bytes: Contenido binario del archivo
+        nombre_archivo: Nombre original (su extensión define los motores candidatos)
+        motor: Forzar un motor por nombre ('calamine', 'openpyxl', 'pandas')
+
+    Returns:
+        Tupla (DataFrame crudo, nombre de hoja usada)
+    """
+    candidatos = lectores_para(nombre_archivo, archivo_bytes)
+    if motor is not None:
+        candidatos = [l for l in candidatos if l.nombre == motor]
+    if not candidatos:
+        raise ValueError(f"No hay motor de lectura disponible para '{nombre_archivo}'")
+
+    for i, lector in enumerate(candidatos):
+        inicio = time.perf_counter()
+        try:
+            df, hoja = lector().leer(archivo_bytes)
+        except Exception as e:
+            if i == len(candidatos) - 1:
+                raise
+            logger.warning(f"Motor {lector.nombre} falló ({e}); usando {candidatos[i + 1].nombre}")
+            continue
+        logger.info(
+            f"Motor de lectura: {lector.nombre} ({time.perf_counter() - inicio:.3f}s, "
+            f"{len(df)} filas)"
+        )
+        return df, hoja
+
+
+def leer_archivo(ruta: str, motor: str = None) -> tuple:
+    """Atajo para scripts: lee un libro desde disco. Retorna (DataFrame crudo, hoja)."""
+    with open(ruta, 'rb') as f:
+        return cargar_libro(f.read(), os.path.basename(ruta), motor=motor)
+
+
+def leer_csv_por_bloques(ruta: str, filas_bloque: int = LectorCSV.filas_bloque):
+    """
+    Recorre un CSV del disco en bloques de `filas_bloque` filas sin cargarlo
+    completo (historias de varios años). Cada bloque es un DataFrame crudo con
+    los mismos tipos por columna que LectorCSV.leer sobre el archivo completo
+    (una primera pasada fija los tipos numéricos; inferirlos por bloque daría
+    p. ej. texto en un bloque y float en otro); para DataProcessor.procesar_en_bloques.
+    """
+    def fragmentos():
+        with open(ruta, 'rb') as f:
+            while fragmento := f.read(TAMANO_FRAGMENTO_CSV):
+                yield fragmento
+
+    codificacion = LectorCSV.detectar_codificacion(fragmentos)
+    with open(ruta, 'rb') as f:
+        cabecera = f.read(TAMANO_FRAGMENTO_CSV)
+    opciones = LectorCSV.opciones(cabecera, codificacion)
+    with pd.read_csv(ruta, chunksize=filas_bloque, **opciones) as lector:
+        tipos = LectorCSV.tipos_numericos(lector)
+    with pd.read_csv(ruta, chunksize=filas_bloque, **opciones) as lector:
+        for bloque in lector:
+            for col, tipo in tipos.items():
+                bloque[col] = pd.to_numeric(bloque[col]).astype(tipo)
+            yield bloque
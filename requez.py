@@ -5,17 +5,18 @@ from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
+from readers import leer_archivo
+import logging
+logging.basicConfig(level=logging.INFO)  # Muestra el motor de lectura usado y su tiempo
+
 # Cargar el archivo Excel
 file_path = '/mnt/kimi/upload/Seguimiento gestion despachos TECU Aura.xlsx'
 
-# Ver las hojas disponibles
-xl = pd.ExcelFile(file_path)
-print("Hojas disponibles:", xl.sheet_names)
+# Cargar la hoja de Base Ventas (hoja y fila de encabezado se detectan automáticamente)
+df, hoja = leer_archivo(file_path)
+print("Hoja usada:", hoja)
 print()
 
-# Cargar la hoja de Base Ventas
-df = pd.read_excel(file_path, sheet_name='Base Ventas', header=2)  # Header en fila 3 (índice 2)
-
 print("=" * 80)
 print("INFORMACIÓN GENERAL DE BASE VENTAS")
 print("=" * 80)
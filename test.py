@@ -1,6 +1,8 @@
-import pandas as pd
+import logging
 from data_processor import DataProcessor
-df = pd.read_excel('Seguimiento gestion despachos TECU 2026 Indicadores.xlsx', header=3)
+from readers import leer_archivo
+logging.basicConfig(level=logging.INFO)  # Muestra el motor de lectura usado y su tiempo
+df, hoja = leer_archivo('Seguimiento gestion despachos TECU 2026 Indicadores.xlsx')
 dp = DataProcessor(df)
 proc_df = dp.procesar()
 print("Value counts Cumple_NNS:")
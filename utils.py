@@ -2,7 +2,12 @@
 Utilidades para cálculo de días hábiles y festivos Colombia
 """
 
-from datetime import date, timedelta
+from datetime import date
+from functools import lru_cache
+import re
+import unicodedata
+
+import numpy as np
 import pandas as pd
 
 
@@ -81,6 +86,47 @@ CIUDADES_3_DIAS = [
     'cali', 'valle del cauca', 'palmira', 'yumbo',
 ]
 
+# Ciudades principales usadas por DataProcessor (columna Ciudad del archivo de seguimiento)
+CIUDADES_PRINCIPALES = ['Bogotá', 'Medellín', 'Cali', 'Bogotá y alrededores']
+
+
+# ─────────────────────────────────────────────
+# Calendario hábil precompilado (lunes a viernes, sin festivos)
+# ─────────────────────────────────────────────
+CALENDARIO_HABIL = np.busdaycalendar(
+    weekmask='1111100',
+    holidays=np.array(sorted(FESTIVOS_COLOMBIA), dtype='datetime64[D]'),
+)
+
+
+def _a_dias(fechas) -> np.ndarray:
+    """Convierte una colección de fechas a datetime64[D]; los valores inválidos quedan como NaT."""
+    valores = pd.to_datetime(pd.Series(fechas), errors='coerce')
+    return valores.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+
+
+def calcular_dias_habiles_series(fechas_inicio, fechas_fin) -> pd.Series:
+    """
+    Versión vectorizada de calcular_dias_habiles para columnas completas.
+
+    Cuenta días hábiles entre fechas_inicio y fechas_fin (ambas incluidas)
+    usando np.busday_count sobre CALENDARIO_HABIL. Devuelve una Serie float
+    alineada con fechas_inicio: NaN si falta alguna fecha, 0 si fin < inicio.
+    """
+    inicio = _a_dias(fechas_inicio)
+    fin = _a_dias(fechas_fin)
+
+    validos = ~(np.isnat(inicio) | np.isnat(fin))
+    dias = np.full(len(inicio), np.nan)
+    if validos.any():
+        ini_v, fin_v = inicio[validos], fin[validos]
+        # busday_count excluye el día final: se suma un día para incluirlo
+        conteo = np.busday_count(ini_v, fin_v + np.timedelta64(1, 'D'), busdaycal=CALENDARIO_HABIL)
+        dias[validos] = np.where(fin_v < ini_v, 0, conteo)
+
+    index = fechas_inicio.index if isinstance(fechas_inicio, pd.Series) else None
+    return pd.Series(dias, index=index, dtype='float64')
+
 
 def calcular_dias_habiles(fecha_inicio, fecha_fin):
     """
@@ -90,23 +136,79 @@ def calcular_dias_habiles(fecha_inicio, fecha_fin):
     if pd.isna(fecha_inicio) or pd.isna(fecha_fin):
         return None
 
-    if isinstance(fecha_inicio, pd.Timestamp):
-        fecha_inicio = fecha_inicio.date()
-    if isinstance(fecha_fin, pd.Timestamp):
-        fecha_fin = fecha_fin.date()
+    dias = calcular_dias_habiles_series([fecha_inicio], [fecha_fin]).iloc[0]
+    return None if pd.isna(dias) else int(dias)
+
+
+# ─────────────────────────────────────────────
+# Índice de normalización de ciudades
+# ─────────────────────────────────────────────
+TAMANO_CACHE_CIUDADES = 4096
+
+
+@lru_cache(maxsize=TAMANO_CACHE_CIUDADES)
+def normalizar_ciudad(ciudad: str) -> str:
+    """Minúsculas, sin espacios extremos y sin tildes/diéresis (memoizado por texto crudo)."""
+    descompuesto = unicodedata.normalize('NFKD', ciudad.strip().lower())
+    return ''.join(ch for ch in descompuesto if not unicodedata.combining(ch))
+
+
+class IndiceCiudades:
+    """
+    Índice de ciudades principales construido una sola vez.
+
+    El vocabulario se normaliza al crear el índice y se compila en un único
+    patrón regex; la clasificación de cada ciudad cruda se memoiza en una
+    caché LRU acotada (el vocabulario real tiene pocos cientos de valores).
+    """
+
+    def __init__(self, ciudades: list, max_cache: int = TAMANO_CACHE_CIUDADES):
+        self.ciudades_norm = tuple(dict.fromkeys(normalizar_ciudad(c) for c in ciudades))
+        # Alternativas más largas primero para que el patrón sea determinista
+        alternativas = sorted(self.ciudades_norm, key=len, reverse=True)
+        self._patron = re.compile('|'.join(re.escape(c) for c in alternativas))
+        self._es_principal = lru_cache(maxsize=max_cache)(self._evaluar)
+
+    def _evaluar(self, ciudad: str) -> bool:
+        return self._patron.search(normalizar_ciudad(ciudad)) is not None
+
+    def es_principal(self, ciudad) -> bool:
+        """True si la ciudad contiene alguna ciudad principal del vocabulario."""
+        if pd.isna(ciudad):
+            return False
+        return self._es_principal(str(ciudad))
+
+    def clasificar(self, ciudades) -> np.ndarray:
+        """Versión por lotes de es_principal (una evaluación por valor distinto)."""
+        return np.array([self.es_principal(c) for c in ciudades], dtype=bool)
+
+    def estadisticas(self) -> dict:
+        """Aciertos, fallos y tasa de aciertos de la caché de clasificación."""
+        return _resumen_cache(self._es_principal.cache_info())
+
+
+def _resumen_cache(info) -> dict:
+    consultas = info.hits + info.misses
+    return {
+        'aciertos': info.hits,
+        'fallos': info.misses,
+        'tasa_aciertos': round(info.hits / consultas * 100, 1) if consultas else 0.0,
+        'entradas': info.currsize,
+    }
 
-    if fecha_fin < fecha_inicio:
-        return 0
 
-    dias_habiles = 0
-    fecha_actual = fecha_inicio
+# Índices compartidos: utils (SLA 3 días) y DataProcessor (ciudades principales)
+INDICE_SLA_3_DIAS = IndiceCiudades(CIUDADES_3_DIAS)
+INDICE_CIUDADES_PRINCIPALES = IndiceCiudades(CIUDADES_PRINCIPALES)
 
-    while fecha_actual <= fecha_fin:
-        if fecha_actual.weekday() < 5 and fecha_actual not in FESTIVOS_COLOMBIA:
-            dias_habiles += 1
-        fecha_actual += timedelta(days=1)
 
-    return dias_habiles
+def estadisticas_cache_ciudades() -> dict:
+    """Tasas de acierto de la normalización y de ambos índices de ciudades."""
+    return {
+        'normalizacion': _resumen_cache(normalizar_ciudad.cache_info()),
+        'sla_3_dias': INDICE_SLA_3_DIAS.estadisticas(),
+        'ciudades_principales': INDICE_CIUDADES_PRINCIPALES.estadisticas(),
+    }
 
 
 def determinar_sla_entrega(ciudad, principal_val=3, other_val=5):
@@ -115,21 +217,7 @@ def determinar_sla_entrega(ciudad, principal_val=3, other_val=5):
       - principal_val (ej 3) → Bogotá, Medellín, Cali y alrededores
       - other_val (ej 5) → Todas las demás
     """
-    if pd.isna(ciudad):
-        return other_val
-
-    ciudad_str = str(ciudad).strip().lower()
-    # Eliminar tildes comunes para comparación robusta
-    ciudad_norm = (ciudad_str
-                   .replace('á', 'a').replace('é', 'e')
-                   .replace('í', 'i').replace('ó', 'o').replace('ú', 'u'))
-
-    for c in CIUDADES_3_DIAS:
-        c_norm = (c.replace('á', 'a').replace('é', 'e')
-                   .replace('í', 'i').replace('ó', 'o').replace('ú', 'u'))
-        if c_norm in ciudad_norm:
-            return principal_val
-    return other_val
+    return principal_val if INDICE_SLA_3_DIAS.es_principal(ciudad) else other_val
 
 
 def determinar_area_incumple(desvio_despacho, desvio_entrega, transportadora):